@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for task_sheet_gui
+
+قياس أداء مسارات Google Sheets بدون حساب Google ولا شبكة:
+- ورقة وهمية في الذاكرة (FakeWorksheet/FakeSpreadsheet) بنفس دوال gspread التي يستخدمها البرنامج
+- زمن استجابة وتذبذب وعرض نطاق قابلة للضبط، وأحجام 1k/10k/100k صف بنصوص واقعية الطول
+- لكل مسار: عدد الطلبات (round trips)، البايتات، والزمن الفعلي
+
+الاستخدام:
+    python bench_task_sheet_gui.py --sizes 1000 10000 --latency-ms 120 --jitter-ms 40
+    python bench_task_sheet_gui.py --out bench_output.txt
+"""
+
+import argparse
+import importlib
+import os
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import gspread
+
+# البرنامج يُستورد داخل bench_home() بعد توجيه HOME إلى مجلد مؤقت (يقرأ Path.home() عند الاستيراد)
+app = None
+
+_HOME_VARS = ("HOME", "USERPROFILE", "GOOGLE_APPLICATION_CREDENTIALS")
+
+
+@contextmanager
+def bench_home():
+    """
+    مجلد HOME مؤقت لملفات الإعدادات وSQLite أثناء القياس، يُحذف في النهاية،
+    وتُعاد متغيّرات البيئة كما كانت. يستورد البرنامج (app) عند أول دخول.
+    """
+    global app
+    saved = {k: os.environ.get(k) for k in _HOME_VARS}
+    with tempfile.TemporaryDirectory(prefix="task_sheet_bench_", ignore_cleanup_errors=True) as home:
+        os.environ["HOME"] = os.environ["USERPROFILE"] = home
+        os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+        try:
+            app = importlib.import_module("task_sheet_gui")
+            # إن كان مستوردًا مسبقًا فمساراته تشير إلى HOME الحقيقي: وجّهها للمجلد المؤقت
+            app._CFG_FILE = Path(home) / app._CFG_FILE.name
+            app._DB_FILE = Path(home) / app._DB_FILE.name
+            app._DB = None
+            app._READ_LOCAL = threading.local()
+            app._STORE = app._LOCAL_STORE
+            yield home
+        finally:
+            with app._DB_LOCK:
+                if app._DB is not None:
+                    app._DB.close()
+            conn = getattr(app._READ_LOCAL, "conn", None)
+            if conn is not None:
+                conn.close()
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+
+# ===================== الشبكة الوهمية =====================
+class FakeNetwork:
+    """يحاكي كلفة الطلب: زمن ثابت ± تذبذب، ثم زمن نقل حسب حجم البيانات."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, mbps=0.0, seed=1):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.bytes_per_sec = mbps * 125_000.0  # Mbit/s → بايت/ثانية
+        self._rnd = random.Random(seed)
+
+    def wait(self, payload=None):
+        delay = max(0.0, self.latency + self._rnd.uniform(-self.jitter, self.jitter))
+        if self.bytes_per_sec and payload is not None:
+            delay += app._payload_size(payload)[1] / self.bytes_per_sec
+        if delay:
+            time.sleep(delay)
+
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _parse_a1(name: str):
+    """'A5:V', '1:1', 'A:A', 'C3' → (r1, c1, r2, c2) مع حدود مفتوحة كـ None."""
+    name = name.split("!")[-1].replace("$", "")
+    m = re.fullmatch(r"([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?", name)
+    if not m:
+        raise ValueError(f"Unsupported range: {name}")
+    c1, r1, c2, r2 = m.groups()
+    if c2 is None and r2 is None:
+        c2, r2 = c1, r1
+    return (int(r1) if r1 else 1, _col_index(c1) if c1 else 1,
+            int(r2) if r2 else None, _col_index(c2) if c2 else None)
+
+
+def _trim(rows):
+    """مثل ردود Sheets: حذف الخلايا الفارغة في نهاية كل صف والصفوف الفارغة في النهاية."""
+    out = []
+    for r in rows:
+        r = list(r)
+        while r and r[-1] == "":
+            r.pop()
+        out.append(r)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+class FakeSpreadsheet(gspread.Spreadsheet):
+    """Spreadsheet في الذاكرة (يرث من gspread حتى يمرّ عبر المجدول والتتبّع كالأصلي)."""
+
+    def __init__(self, title, net):
+        self._title = title
+        self.net = net
+        self._sheets = {}
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def id(self):
+        return f"fake-{self._title}"
+
+    def worksheet(self, title):
+        self.net.wait()
+        return self._sheets[title]
+
+    def add(self, ws):
+        self._sheets[ws.title] = ws
+        return ws
+
+
+class FakeWorksheet(gspread.Worksheet):
+    """Worksheet في الذاكرة بنفس دوال gspread المستخدمة في task_sheet_gui."""
+
+    def __init__(self, spreadsheet, title, rows, cols=26):
+        self._spreadsheet = spreadsheet
+        self._title = title
+        self._rows = [list(r) for r in rows]
+        self._cols = cols
+        self.net = spreadsheet.net
+        spreadsheet.add(self)
+
+    # ---- خصائص بلا طلبات ----
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def id(self):
+        return 0
+
+    @property
+    def spreadsheet(self):
+        return self._spreadsheet
+
+    @property
+    def row_count(self):
+        return max(1000, len(self._rows))
+
+    @property
+    def col_count(self):
+        return max(self._cols, max((len(r) for r in self._rows), default=0))
+
+    # ---- قراءات ----
+    def _slice(self, name):
+        r1, c1, r2, c2 = _parse_a1(name)
+        r2 = len(self._rows) if r2 is None else min(r2, len(self._rows))
+        out = []
+        for r in self._rows[r1 - 1:r2]:
+            out.append(r[c1 - 1:c2] if c1 <= len(r) else [])
+        return _trim(out)
+
+    def get_all_values(self, *args, **kwargs):
+        rows = _trim(self._rows)
+        width = max((len(r) for r in rows), default=0)
+        res = [r + [""] * (width - len(r)) for r in rows]
+        self.net.wait(res)
+        return res
+
+    def col_values(self, col, *args, **kwargs):
+        res = [r[col - 1] if len(r) >= col else "" for r in self._rows]
+        while res and res[-1] == "":
+            res.pop()
+        self.net.wait(res)
+        return res
+
+    def row_values(self, row, *args, **kwargs):
+        res = _trim([self._rows[row - 1]])[0] if row <= len(self._rows) else []
+        self.net.wait(res)
+        return res
+
+    def get(self, range_name=None, *args, **kwargs):
+        res = self._slice(range_name)
+        self.net.wait(res)
+        return res
+
+    def batch_get(self, ranges, *args, **kwargs):
+        res = [self._slice(r) for r in ranges]
+        self.net.wait(res)
+        return res
+
+    # ---- كتابات ----
+    def _set(self, r, c, v):
+        while len(self._rows) < r:
+            self._rows.append([])
+        row = self._rows[r - 1]
+        while len(row) < c:
+            row.append("")
+        row[c - 1] = str(v)
+
+    def batch_update(self, data, *args, **kwargs):
+        self.net.wait(data)
+        for d in data:
+            r1, c1, _, _ = _parse_a1(d["range"])
+            for i, vals in enumerate(d["values"]):
+                for j, v in enumerate(vals):
+                    self._set(r1 + i, c1 + j, v)
+        return {"totalUpdatedCells": sum(len(v) for d in data for v in d["values"])}
+
+    def insert_row(self, values, index=1, *args, **kwargs):
+        self.net.wait([values])
+        self._rows.insert(index - 1, [str(v) for v in values])
+        return {}
+
+    def append_row(self, values, *args, **kwargs):
+        return self.append_rows([values])
+
+    def append_rows(self, values, *args, **kwargs):
+        self.net.wait(values)
+        last = len(_trim(self._rows))
+        del self._rows[last:]
+        self._rows.extend([str(v) for v in r] for r in values)
+        start, end = last + 1, last + len(values)
+        return {"updates": {
+            "updatedRange": f"'{self._title}'!A{start}:{app._col_letter(max(len(values[0]), 1))}{end}",
+            "updatedRows": len(values),
+        }}
+
+    def delete_rows(self, start_index, end_index=None):
+        self.net.wait()
+        del self._rows[start_index - 1:(end_index or start_index)]
+        return {}
+
+
+# ===================== بيانات واقعية =====================
+_WORDS = ("model response prompt code function error test review rating user request output "
+          "python value return class import data sheet task correct issue fix improve detail").split()
+
+
+def _text_pool(rnd, n, lo, hi):
+    """مجموعة نصوص مُعاد استخدامها (توفير ذاكرة مع 100k صف)."""
+    pool = []
+    for _ in range(n):
+        size = rnd.randint(lo, hi)
+        words = []
+        while sum(len(w) + 1 for w in words) < size:
+            words.append(rnd.choice(_WORDS))
+        pool.append(" ".join(words)[:size])
+    return pool
+
+
+def make_task_rows(n, today_iso, today_share=0.002, seed=7):
+    """n صف مهمة بترتيب HEADERS: نص prompt/justification/feedback بأطوال واقعية، وجزء منها اليوم."""
+    rnd = random.Random(seed)
+    prompts = _text_pool(rnd, 64, 800, 3000)
+    justs = _text_pool(rnd, 64, 400, 1500)
+    feeds = _text_pool(rnd, 64, 100, 800)
+    rows = [list(app.HEADERS)]
+    for i in range(n):
+        today = i >= n - max(1, int(n * today_share))
+        d = today_iso if today else f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+        row = [""] * len(app.HEADERS)
+        row[0] = f"{rnd.getrandbits(96):024x}"
+        row[1], row[2], row[3] = rnd.choice(prompts), rnd.choice(justs), rnd.choice(feeds)
+        row[4] = str(rnd.randint(1, 5))
+        row[5] = "hopper_code_rlhf"
+        row[6] = f"{rnd.uniform(0.2, 1.5):.2f}"
+        row[7], row[8] = "reviewer", "NONE"
+        row[9] = d
+        rows.append(row)
+    return rows
+
+
+def make_external(net, team=40, days=300, seed=11):
+    """الشيت الخارجي: Daily Hours (اسم × تاريخ) و WFH (سجلّ الفريق)."""
+    rnd = random.Random(seed)
+    ext = FakeSpreadsheet("External", net)
+    names = [f"Member {i}" for i in range(team)] + [app.PERSON_FULLNAME_FOR_DAILY]
+    dates = [f"2025/{1 + d // 28 % 12:02d}/{1 + d % 28:02d}" for d in range(days)]
+    daily = [["Name"] + dates] + [[n] + [f"{rnd.uniform(4, 9):.2f}" for _ in dates] for n in names]
+    FakeWorksheet(ext, app.DAILY_HOURS_SHEET, daily)
+    wfh = [["Name", "Date"]] + [[rnd.choice(names), f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"]
+                                for _ in range(team * days // 4)]
+    FakeWorksheet(ext, app.WFH_SHEET, wfh)
+    return ext
+
+
+# ===================== التشغيل =====================
+def _reset_app_state(ws, ext):
+    """ربط البرنامج بالورقة الوهمية وتصفير كل الكاشات بين السيناريوهات."""
+    app._WS = app._scheduled(ws)
+    app._EXT_SH = app._scheduled(ext)
+    app._EXT_WS.clear()
+    app.RUNTIME_SHEET_ID = f"bench-{len(ws._rows)}"
+    app.RUNTIME_WORKSHEET_TITLE = ws.title
+    app._LOCAL_STORE._synced_at.clear()
+    app._DAILY_CELL_VERIFIED = None
+    app._save_cfg({})
+    with app._DB_LOCK:
+        conn = app._db()
+        with conn:
+            for table in ("outbox", "task_rows", "task_rows_meta"):
+                conn.execute(f"DELETE FROM {table}")
+
+
+def measure(label, fn, results):
+    """يشغّل fn ويسجّل: عدد الطلبات، البايتات، والزمن الفعلي."""
+    before = len(app._TRACE.records())
+    t0 = time.perf_counter()
+    error = None
+    try:
+        fn()
+    except Exception as e:  # نسجّل الفشل بدل إيقاف بقية القياسات
+        error = f"{type(e).__name__}: {e}"
+    wall = (time.perf_counter() - t0) * 1000.0
+    recs = app._TRACE.records()[before:]
+    results.append({
+        "path": label,
+        "round_trips": len(recs),
+        "kb": sum(r["bytes"] for r in recs) / 1024.0,
+        "wall_ms": wall,
+        "ops": ",".join(sorted({r["op"] for r in recs})),
+        "error": error,
+    })
+
+
+class _BenchLoop:
+    """بديل حلقة Tk لـ UiExecutor: bind/event_generate، وحلقة تنتظر الأحداث بلا استطلاع."""
+
+    def __init__(self):
+        self._events = queue.Queue()
+        self._handlers = {}
+
+    def bind(self, name, fn):
+        self._handlers[name] = fn
+
+    def event_generate(self, name, when=None):
+        self._events.put(name)
+
+    def report_callback_exception(self, exc, val, tb):
+        raise val
+
+    def run_until(self, done, timeout=600.0):
+        deadline = time.monotonic() + timeout
+        while not done():
+            self._handlers[self._events.get(timeout=max(0.0, deadline - time.monotonic()))]()
+
+
+def _stats_page(loop):
+    """أقل ما يحتاجه TaskFormPage._refresh_daily_stats_from_sheet ليعمل بلا نافذة."""
+    page = SimpleNamespace(controller=SimpleNamespace(bg=app.UiExecutor(loop)),
+                           _stats_last=None, _stats_busy=False, _stats_again=False)
+    for name in ("_refresh_daily_stats_from_sheet", "_on_stats", "_today_local_iso"):
+        setattr(page, name, getattr(app.TaskFormPage, name).__get__(page))
+    page._show_stats = lambda count, hours, stale=False: None
+    return page
+
+
+def measure_stats_refresh(label, page, loop, results):
+    """
+    مسار تحديث الإحصائيات كما في الواجهة: النداء على خيط Tk (يجب أن يعود فورًا)
+    ثم انتظار وصول القيم الجديدة عبر UiExecutor. يُسجَّل سطران: حتى القيم الجديدة، وزمن حجب خيط Tk.
+    """
+    blocked = {}
+
+    def cycle():
+        t0 = time.perf_counter()
+        page._refresh_daily_stats_from_sheet()
+        blocked["ms"] = (time.perf_counter() - t0) * 1000.0
+        loop.run_until(lambda: not page._stats_busy)
+
+    measure(f"{label} until fresh", cycle, results)
+    results.append({"path": f"{label} Tk thread blocked", "round_trips": 0, "kb": 0.0,
+                    "wall_ms": blocked.get("ms", 0.0), "ops": "", "error": None})
+
+
+def run_size(n, net, out_dir):
+    today_iso = datetime.now(app.JO_TZ).strftime("%Y-%m-%d")
+    ss = FakeSpreadsheet("Bench Tasks", net)
+    ws = FakeWorksheet(ss, "Tasks", make_task_rows(n, today_iso))
+    ext = make_external(net)
+    _reset_app_state(ws, ext)
+    app._TRACE.clear()
+
+    results = []
+    page = SimpleNamespace()
+    row = make_task_rows(1, today_iso, seed=n + 1)[1]
+    row[0] = f"{random.getrandbits(96):024x}"
+
+    form = app.TaskFormPage
+    loop = _BenchLoop()
+    stats_page = _stats_page(loop)
+    measure_stats_refresh("stats: _refresh_daily_stats (cold)", stats_page, loop, results)
+    measure_stats_refresh("stats: _refresh_daily_stats (warm)", stats_page, loop, results)
+    measure("dedupe: task_id_exists (first call)", lambda: app.task_id_exists(row[0]), results)
+    measure("submit: _worker_append", lambda: form._worker_append(page, row), results)
+    measure("submit: outbox flush to sheet", lambda: app._OUTBOX.flush(timeout=120), results)
+
+    csv_path = Path(out_dir) / f"bench-{n}.csv"
+    measure("export: export_current_worksheet_to_csv (full)",
+            lambda: app.export_current_worksheet_to_csv(csv_path), results)
+    measure("export: export_current_worksheet_to_csv (incremental)",
+            lambda: app.export_current_worksheet_to_csv(csv_path, incremental=True), results)
+
+    measure("finish: compute_today_hours_from_current_sheet",
+            lambda: app.compute_today_hours_from_current_sheet(), results)
+    measure("finish: update_daily_hours_in_external_sheet (first)",
+            lambda: app.update_daily_hours_in_external_sheet(7.5), results)
+    measure("finish: update_daily_hours_in_external_sheet (repeat)",
+            lambda: app.update_daily_hours_in_external_sheet(7.75), results)
+    measure("finish: upsert_wfh_row_if_needed (first)", lambda: app.upsert_wfh_row_if_needed(7.75), results)
+    measure("finish: upsert_wfh_row_if_needed (repeat)", lambda: app.upsert_wfh_row_if_needed(7.75), results)
+    return results
+
+
+def format_results(n, results) -> str:
+    lines = [f"== {n:,} rows ==",
+             f"{'path':<58}{'calls':>6}{'KB':>12}{'wall ms':>11}  ops"]
+    for r in results:
+        lines.append(f"{r['path']:<58}{r['round_trips']:>6}{r['kb']:>12.1f}{r['wall_ms']:>11.1f}  {r['ops']}")
+        if r["error"]:
+            lines.append(f"{'':<58}  ! {r['error']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline benchmarks for task_sheet_gui (no network).")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="زمن ثابت لكل طلب")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="تذبذب ± حول الزمن الثابت")
+    ap.add_argument("--mbps", type=float, default=0.0, help="عرض النطاق (0 = بلا كلفة نقل)")
+    ap.add_argument("--respect-quota", action="store_true",
+                    help="إبقاء حصص Sheets الحقيقية في المجدول (افتراضيًا تُرفع لقياس المسارات فقط)")
+    ap.add_argument("--out", help="حفظ النتائج في ملف نصّي أيضًا")
+    args = ap.parse_args(argv)
+
+    with bench_home():
+        return _run(args)
+
+
+def _run(args):
+    if not args.respect_quota:
+        app._SCHEDULER = app.SheetsScheduler(reads_per_min=10 ** 9, writes_per_min=10 ** 9)
+    app._OUTBOX.max_linger = 0.0
+    net = FakeNetwork(args.latency_ms, args.jitter_ms, args.mbps)
+
+    reports = [f"latency={args.latency_ms}ms jitter={args.jitter_ms}ms bandwidth={args.mbps or 'inf'}Mbit/s"]
+    with tempfile.TemporaryDirectory() as out_dir:
+        for n in args.sizes:
+            reports.append(format_results(n, run_size(n, net, out_dir)))
+            print(reports[-1], flush=True)
+    if args.out:
+        Path(args.out).write_text("\n\n".join(reports) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
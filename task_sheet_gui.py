@@ -12,19 +12,34 @@ Task Sheet GUI for Google Sheets
 
 import tkinter as tk
 from tkinter import messagebox, scrolledtext, ttk, filedialog
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from zoneinfo import ZoneInfo
+import argparse
 import csv
+import hashlib
 from pathlib import Path
 import json
 import os
 
 import re
 import time
+import heapq
+import itertools
+import random
+import statistics
+from collections import deque
+import sqlite3
+import sys
 import threading, queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from abc import ABC, abstractmethod
 
 import gspread
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
 
 # محاولة استيراد sv_ttk (اختياري). إن لم يوجد، نستمر بدون كسر البرنامج.
 try:
@@ -82,14 +97,326 @@ _WS = None
 LA_TZ = ZoneInfo("America/Los_Angeles")
 JO_TZ = ZoneInfo("Asia/Amman")
 
-def get_worksheet():
-    """ارجع Worksheet باستخدام القيم المُعطاة من شاشة الإعداد."""
-    global _WS, RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE
-    if _WS is not None:
-        return _WS
-    if not RUNTIME_SHEET_ID or not RUNTIME_WORKSHEET_TITLE:
-        raise RuntimeError("Sheet ID/Worksheet title are not set yet.")
+# ===================== بناء صف المهمة =====================
+def ot_default_for_weekday(wd: int) -> str:
+    """OT الافتراضي ليوم (Mon=0..Sun=6 بتوقيت لوس أنجلِس): Yes يومي Fri(4)/Sat(5)، وإلا No."""
+    return "Yes" if wd in (4, 5) else "No"
+
+def build_task_row(task_id, prompt, justification, feedback, rating, project, duration_hours,
+                   level, verdict, started_at: datetime, submitted_at: datetime, ot=None) -> list:
+    """
+    صف مهمة بنفس ترتيب HEADERS (يستخدمه النموذج والاستيراد من سطر الأوامر).
+    started_at/submitted_at: datetime (بلا منطقة زمنية = توقيت عمّان)؛ منهما تُحسب تواريخ
+    وأوقات عمّان ولوس أنجلِس واختصارات اليوم/الشهر. ot=None: الافتراضي حسب يوم الإرسال في LA.
+    """
+    def _text(v):
+        return str(v if v is not None else "").strip()
+
+    def _jo(dt):
+        return (dt.replace(tzinfo=JO_TZ) if dt.tzinfo is None else dt).astimezone(JO_TZ)
+
+    start_jo, now_jo = _jo(started_at), _jo(submitted_at)
+    start_us, us_now = start_jo.astimezone(LA_TZ), now_jo.astimezone(LA_TZ)
+    if isinstance(duration_hours, (int, float)):
+        duration_hours = f"{duration_hours:.2f}"  # مثال: 0.75 ساعة
+    if ot is None:
+        ot = ot_default_for_weekday(us_now.weekday())
+
+    return [
+        _text(task_id),
+        _text(prompt),
+        _text(justification),
+        _text(feedback),
+        _text(rating),
+        _text(project),
+        _text(duration_hours),
+        _text(level),
+        _text(verdict),
+        now_jo.strftime("%Y-%m-%d"),            # Date (محلي)
+        DAY_ABBR[now_jo.weekday()],
+        MONTH_ABBR[now_jo.month - 1],
+        str(now_jo.month),
+        start_jo.strftime("%H:%M"),             # Started Time
+        now_jo.strftime("%H:%M"),               # Submitted time
+        us_now.strftime("%Y-%m-%d"),            # Date (US)
+        DAY_ABBR[us_now.weekday()],             # Day (US)
+        MONTH_ABBR[us_now.month - 1],           # Month (US)
+        str(us_now.month),
+        start_us.strftime("%H:%M"),
+        us_now.strftime("%H:%M"),               # Submitted time (US)
+        _text(ot),                              # OT
+    ]
+
+# ===================== مجدول طلبات Sheets =====================
+# حصص Google Sheets لكل مستخدم في الدقيقة (قراءة/كتابة منفصلتان)
+SHEETS_READS_PER_MIN = 60
+SHEETS_WRITES_PER_MIN = 60
+SHEETS_MAX_RETRIES = 6
+SHEETS_BACKOFF_BASE_SEC = 1.0
+SHEETS_BACKOFF_MAX_SEC = 64.0
+
+# الأولوية: الأصغر يُخدم أولًا
+PRIO_USER = 0        # كتابات وقراءات ينتظرها المستخدم
+PRIO_BACKGROUND = 1  # مطابقات/تحديثات خلفية
+
+# استدعاءات تستهلك من حصة الكتابة؛ ما عداها من الدوال العامة يُحسب قراءة
+_WRITE_METHODS = {
+    "append_row", "append_rows", "update", "update_cell", "update_cells", "batch_update",
+    "insert_row", "insert_rows", "delete_rows", "add_worksheet", "values_append",
+    "values_update", "values_batch_update", "batch_clear", "clear",
+}
+
+_PRIORITY = threading.local()
+
+
+class _PriorityScope:
+    """with sheets_priority(PRIO_USER): ... لتغيير أولوية طلبات الخيط الحالي مؤقتًا."""
+
+    def __init__(self, prio):
+        self.prio = prio
+
+    def __enter__(self):
+        self._prev = getattr(_PRIORITY, "value", None)
+        _PRIORITY.value = self.prio
+        return self
+
+    def __exit__(self, *exc):
+        _PRIORITY.value = self._prev
+        return False
+
+
+def sheets_priority(prio):
+    return _PriorityScope(prio)
+
+
+def _is_retryable_error(e: Exception, kind: str = "read") -> bool:
+    """
+    القراءة: 429 (تجاوز الحصة) و5xx وأخطاء الشبكة المؤقتة تستحق إعادة المحاولة.
+    الكتابة: 429 فقط (الطلب رُفض ولم يُكتب شيء)؛ بعد مهلة أو 5xx قد تكون الكتابة تمّت،
+    وإعادتها تُكرّر append_rows أو تحذف صفًا آخر بعد إزاحة الشيت. يتكفّل بها الصندوق وتحقّقه بعد الكتابة.
+    """
+    if isinstance(e, gspread.exceptions.APIError):
+        code = getattr(getattr(e, "response", None), "status_code", None)
+        if kind == "write":
+            return code == 429
+        return code in (408, 429, 500, 502, 503, 504)
+    if kind == "write":
+        return False
+    return isinstance(e, (ConnectionError, TimeoutError, RequestsConnectionError, RequestsTimeout))
+
+
+class SheetsScheduler:
+    """
+    مجدول مركزي لكل طلبات Sheets:
+    - دلو رموز (token bucket) لكل نوع (قراءة/كتابة) بسعة الحصة في الدقيقة.
+    - طابور أولوية: الطلب الأعلى أولوية ينال الرمز التالي أولًا.
+    - إعادة المحاولة بتأخير أُسّي مع jitter: عند 429/5xx للقراءة، وعند 429 فقط للكتابة.
+    """
 
+    def __init__(self, reads_per_min=SHEETS_READS_PER_MIN, writes_per_min=SHEETS_WRITES_PER_MIN):
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        now = time.monotonic()
+        # النوع → [السعة، الرموز المتاحة، آخر تعبئة]
+        self._buckets = {
+            "read": [float(reads_per_min), float(reads_per_min), now],
+            "write": [float(writes_per_min), float(writes_per_min), now],
+        }
+        self._waiting = {"read": [], "write": []}
+
+    def _refill(self, kind):
+        b = self._buckets[kind]
+        now = time.monotonic()
+        b[1] = min(b[0], b[1] + (now - b[2]) * b[0] / 60.0)
+        b[2] = now
+
+    def _acquire(self, kind, prio):
+        with self._cond:
+            ticket = (prio, next(self._seq))
+            heapq.heappush(self._waiting[kind], ticket)
+            while True:
+                self._refill(kind)
+                b = self._buckets[kind]
+                if self._waiting[kind][0] == ticket and b[1] >= 1.0:
+                    heapq.heappop(self._waiting[kind])
+                    b[1] -= 1.0
+                    self._cond.notify_all()
+                    return
+                # انتظر حتى يتوفّر رمز أو يتغيّر رأس الطابور
+                self._cond.wait(timeout=max(0.01, (1.0 - b[1]) * 60.0 / b[0]))
+
+    def call(self, kind, fn, *args, priority=None, **kwargs):
+        """نفّذ fn(*args, **kwargs) بعد نيل رمز، مع إعادة المحاولة للأخطاء المؤقتة."""
+        if priority is None:
+            priority = getattr(_PRIORITY, "value", None)
+        if priority is None:
+            priority = PRIO_USER if kind == "write" else PRIO_BACKGROUND
+        attempt = 0
+        while True:
+            self._acquire(kind, priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= SHEETS_MAX_RETRIES or not _is_retryable_error(e, kind):
+                    raise
+                # full jitter: انتظار عشوائي حتى الحدّ الأُسّي
+                cap = min(SHEETS_BACKOFF_MAX_SEC, SHEETS_BACKOFF_BASE_SEC * (2 ** attempt))
+                time.sleep(random.uniform(0, cap))
+                attempt += 1
+
+
+_SCHEDULER = SheetsScheduler()
+
+
+# ===================== تتبّع طلبات Sheets =====================
+def _payload_size(obj):
+    """(صفوف، بايتات) تقديرية لقيم Sheets: قائمة خلايا، أو قائمة صفوف، أو قائمة نطاقات، أو ردّ dict."""
+    if isinstance(obj, dict):
+        upd = obj.get("updates", obj)
+        return int(upd.get("updatedRows", 0) or 0), len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+    if not isinstance(obj, (list, tuple)):
+        return 0, (len(str(obj).encode("utf-8")) if obj is not None else 0)
+    if obj and all(isinstance(r, (list, tuple)) for r in obj):
+        if any(isinstance(c, (list, tuple)) for r in obj for c in r):
+            sizes = [_payload_size(r) for r in obj]  # batch_get: قائمة نطاقات
+            return sum(x for x, _ in sizes), sum(y for _, y in sizes)
+        return len(obj), sum(len(str(c).encode("utf-8")) for r in obj for c in r)
+    # قائمة خلايا مسطّحة (col_values مثلًا): كل خلية صف
+    return len(obj), sum(len(str(c).encode("utf-8")) for c in obj)
+
+
+# عمليات قيمتها صف واحد مسطّح (وليس عمودًا)
+_SINGLE_ROW_OPS = {"append_row", "insert_row", "row_values"}
+
+
+class SheetsTrace:
+    """سجلّ دائري لكل طلبات Sheets: العملية، الهدف، الزمن، الصفوف/البايتات، والنتيجة."""
+
+    FIELDS = ("ts", "op", "target", "latency_ms", "rows", "bytes", "outcome")
+
+    def __init__(self, maxlen=5000):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=maxlen)
+
+    def record(self, op, target, latency_ms, rows, nbytes, outcome):
+        with self._lock:
+            self._records.append({
+                "ts": time.time(), "op": op, "target": target, "latency_ms": round(latency_ms, 2),
+                "rows": rows, "bytes": nbytes, "outcome": outcome,
+            })
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """قائمة إحصائيات لكل (عملية، هدف): العدد، p50/p95 للزمن، مجموع الصفوف/البايتات، الأخطاء."""
+        groups = {}
+        for r in self.records():
+            groups.setdefault((r["op"], r["target"]), []).append(r)
+        out = []
+        for (op, target), recs in sorted(groups.items(), key=lambda kv: -sum(r["latency_ms"] for r in kv[1])):
+            lat = sorted(r["latency_ms"] for r in recs)
+            p95 = statistics.quantiles(lat, n=20)[18] if len(lat) > 1 else lat[0]
+            out.append({
+                "op": op, "target": target, "count": len(recs),
+                "p50_ms": round(statistics.median(lat), 1), "p95_ms": round(p95, 1),
+                "total_ms": round(sum(lat), 1),
+                "rows": sum(r["rows"] for r in recs), "bytes": sum(r["bytes"] for r in recs),
+                "errors": sum(1 for r in recs if r["outcome"] != "ok"),
+            })
+        return out
+
+    def export(self, path) -> str:
+        """تصدير السجلّ كـ JSON (مع الملخّص) أو CSV حسب امتداد الملف."""
+        path = Path(path)
+        recs = self.records()
+        if path.suffix.lower() == ".csv":
+            with open(path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+                writer.writeheader()
+                writer.writerows(recs)
+        else:
+            path.write_text(json.dumps({"summary": self.summary(), "records": recs},
+                                       ensure_ascii=False, indent=2), encoding="utf-8")
+        return str(path)
+
+
+_TRACE = SheetsTrace()
+
+
+def _trace_target(obj) -> str:
+    """اسم مقروء لهدف الطلب (Spreadsheet / Worksheet)."""
+    try:
+        if isinstance(obj, gspread.Worksheet):
+            return f"{obj.spreadsheet.title} / {obj.title}"
+        if isinstance(obj, gspread.Spreadsheet):
+            return obj.title
+    except Exception:
+        pass
+    return type(obj).__name__
+
+
+class _Scheduled:
+    """غلاف حول Client/Spreadsheet/Worksheet يمرّر كل استدعاء API عبر _SCHEDULER ويسجّله في _TRACE."""
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return _scheduled(attr) if name == "spreadsheet" else attr
+        kind = "write" if name in _WRITE_METHODS else "read"
+        target = self._target
+
+        def _traced(*args, **kwargs):
+            # كل محاولة تُسجَّل منفصلة (إعادة المحاولة بعد 429 تظهر كطلب آخر)
+            t0 = time.perf_counter()
+            try:
+                res = attr(*args, **kwargs)
+            except Exception as e:
+                rows, nbytes = _payload_size(args[0]) if (kind == "write" and args) else (0, 0)
+                _TRACE.record(name, _trace_target(target), (time.perf_counter() - t0) * 1000.0,
+                              rows, nbytes, f"{type(e).__name__}: {e}"[:200])
+                raise
+            sized = args[0] if (kind == "write" and args) else res
+            rows, nbytes = _payload_size(sized)
+            if name in _SINGLE_ROW_OPS:
+                rows = 1
+            _TRACE.record(name, _trace_target(target), (time.perf_counter() - t0) * 1000.0, rows, nbytes, "ok")
+            return res
+
+        def _call(*args, **kwargs):
+            return _scheduled(_SCHEDULER.call(kind, _traced, *args, **kwargs))
+        _call.__name__ = name
+        return _call
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+
+def _scheduled(obj):
+    """لفّ كائنات gspread (فقط) بالمجدول؛ القيم الأخرى تُعاد كما هي."""
+    if isinstance(obj, (gspread.Client, gspread.Spreadsheet, gspread.Worksheet)):
+        return _Scheduled(obj)
+    return obj
+
+
+# عميل gspread واحد لكل ملف خدمة على مستوى البرنامج (جلسة HTTP واحدة باتصالات keep-alive)
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+HTTP_POOL_SIZE = 10            # اتصالات متزامنة قابلة لإعادة الاستخدام لكل مضيف
+TOKEN_REFRESH_MARGIN_SEC = 300 # جدّد التوكن في الخلفية قبل انتهائه بخمس دقائق
+
+def _resolve_creds_path() -> str:
+    """مسار ملف الخدمة: من المتغيّر البيئي/الإعدادات، وإلا نطلبه من المستخدم."""
     creds_path = _get_service_account_path_from_env_or_cfg()
     if not creds_path:
         creds_path = filedialog.askopenfilename(
@@ -98,44 +425,173 @@ def get_worksheet():
         )
         if not creds_path:
             raise RuntimeError("لم يتم اختيار ملف الخدمة (Service Account).")
+    return creds_path
+
+def _schedule_token_refresh(creds, delay=None):
+    """تجديد التوكن في خيط خلفي قبل انتهائه، حتى لا ينتظره أي طلب."""
+    if delay is None:
+        expiry = getattr(creds, "expiry", None)  # UTC بدون منطقة زمنية
+        if expiry is None:
+            delay = 0.0
+        else:
+            left = (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+            delay = max(30.0, left - TOKEN_REFRESH_MARGIN_SEC)
 
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(RUNTIME_SHEET_ID)
-    ws = sh.worksheet(RUNTIME_WORKSHEET_TITLE)
-
-    # احفظ العناوين إذا الورقة فارغة
-    header_row = ws.row_values(1)
-    if not any(header_row):
-        ws.insert_row(HEADERS, index=1)
+    def _refresh():
+        try:
+            creds.refresh(GoogleAuthRequest())
+        except Exception:
+            _schedule_token_refresh(creds, delay=60.0)  # أعد المحاولة بعد دقيقة
+            return
+        _schedule_token_refresh(creds)
+
+    t = threading.Timer(delay, _refresh)
+    t.daemon = True
+    t.start()
+
+def get_client(creds_path=None):
+    """عميل gspread مُصرّح ومشترك (يُنشأ مرة واحدة لكل ملف خدمة)."""
+    if creds_path is None:
+        creds_path = _resolve_creds_path()
+    key = os.path.abspath(creds_path)
+    with _CLIENTS_LOCK:
+        gc = _CLIENTS.get(key)
+        if gc is None:
+            creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+            gc = gspread.authorize(creds)
+            # مجمّع اتصالات أكبر لأن عدة خيوط تستخدم نفس الجلسة
+            session = getattr(getattr(gc, "http_client", gc), "session", None)
+            if session is not None:
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                creds = getattr(session, "credentials", creds)
+            _schedule_token_refresh(creds)
+            # كل الطلبات عبر هذا العميل (وما يُفتح منه) تمرّ بالمجدول
+            gc = _CLIENTS[key] = _scheduled(gc)
 
     # ✅ احفظ مسار ملف الخدمة للاستخدام اللاحق (إن لم يكن من المتغيّر البيئي)
     try:
         if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-            cfg = _load_cfg()
-            cfg["service_account_file"] = creds_path
-            _save_cfg(cfg)
+            with _edit_cfg() as cfg:
+                cfg["service_account_file"] = creds_path
     except Exception:
         pass
+    return gc
+
+def get_worksheet(creds_path=None):
+    """ارجع Worksheet باستخدام القيم المُعطاة من شاشة الإعداد."""
+    global _WS, RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE
+    if _WS is not None:
+        return _WS
+    if not RUNTIME_SHEET_ID or not RUNTIME_WORKSHEET_TITLE:
+        raise RuntimeError("Sheet ID/Worksheet title are not set yet.")
+
+    gc = get_client(creds_path)
+    sh = gc.open_by_key(RUNTIME_SHEET_ID)
+    ws = sh.worksheet(RUNTIME_WORKSHEET_TITLE)
+
+    # العناوين من الكاش المحفوظ؛ أول مرة لهذه الورقة تُقرأ (وتُكتب إذا الورقة فارغة)
+    if sheet_headers() is None:
+        header_row = ws.row_values(1)
+        if not any(header_row):
+            ws.insert_row(HEADERS, index=1)
+            header_row = HEADERS
+        remember_headers(header_row)
 
     _WS = ws
     return ws
 
 
+# ترتيب أعمدة كل ورقة كما في صفّها الأول، محفوظ في الإعدادات ("header_layouts")
+# ويُطابَق مع الشيت ضمن قراءة الذيل (_STORE.sync) بلا طلب إضافي
+_LAYOUTS = {}
+_LAYOUTS_LOCK = threading.RLock()
+
+def _layout_key(sheet_id=None, worksheet=None) -> str:
+    return f"{sheet_id or RUNTIME_SHEET_ID}/{worksheet or RUNTIME_WORKSHEET_TITLE}"
+
+def _trim_headers(headers) -> list:
+    headers = [str(h).strip() for h in headers]
+    while headers and not headers[-1]:
+        headers.pop()
+    return headers
+
+def sheet_headers(sheet_id=None, worksheet=None):
+    """صف العناوين المعروف للورقة (الحالية افتراضيًا)، أو None إن لم يُقرأ بعد."""
+    key = _layout_key(sheet_id, worksheet)
+    with _LAYOUTS_LOCK:
+        if key not in _LAYOUTS:
+            _LAYOUTS[key] = (_load_cfg().get("header_layouts") or {}).get(key)
+        return _LAYOUTS[key]
+
+def remember_headers(headers, sheet_id=None, worksheet=None) -> None:
+    """حفظ صف العناوين المقروء من الشيت (في الذاكرة والإعدادات) إن تغيّر."""
+    headers = _trim_headers(headers)
+    key = _layout_key(sheet_id, worksheet)
+    with _LAYOUTS_LOCK:
+        if sheet_headers(sheet_id, worksheet) == headers:
+            return
+        _LAYOUTS[key] = headers
+        with _edit_cfg() as cfg:
+            cfg.setdefault("header_layouts", {})[key] = headers
+
+def column_map(headers=None) -> dict:
+    """
+    اسم العمود → فهرسه (0-based) في الورقة الحالية (أو في headers المعطاة).
+    الأسماء غير الموجودة في الورقة تأخذ موضعها في HEADERS.
+    """
+    if headers is None:
+        headers = sheet_headers() or HEADERS
+    found = {name: i for i, name in enumerate(headers) if name}
+    return {name: found.get(name, i) for i, name in enumerate(HEADERS)}
+
+def to_sheet_order(row, headers=None) -> list:
+    """صف بترتيب HEADERS → ترتيب أعمدة الورقة (الأعمدة غير الموجودة فيها تُلحق في النهاية)."""
+    if headers is None:
+        headers = sheet_headers()
+    if not headers or headers[:len(HEADERS)] == HEADERS:
+        return list(row)
+    found = {name: i for i, name in enumerate(headers) if name}
+    out = [""] * len(headers)
+    for name, v in zip(HEADERS, row):
+        if name in found:
+            out[found[name]] = v
+        else:
+            out.append(v)
+    return out
+
+
 def append_task_row(row_values):
     """إضافة صف واحد إلى الشيت بخيار USER_ENTERED (يحاكي إدخال المستخدم)."""
     ws = get_worksheet()
-    ws.append_row(row_values, value_input_option="USER_ENTERED")
+    ws.append_row(to_sheet_order(row_values), value_input_option="USER_ENTERED")
     return ws
 
-def export_current_worksheet_to_csv(dest_path=None):
+def append_task_rows(rows):
+    """إضافة عدة صفوف دفعة واحدة (طلب واحد بدل طلب لكل صف)."""
+    ws = get_worksheet()
+    return ws.append_rows([to_sheet_order(r) for r in rows], value_input_option="USER_ENTERED")
+
+# عدد الصفوف في كل طلب أثناء تصدير CSV (ذاكرة محدودة بدل تحميل الورقة كاملة)
+EXPORT_CHUNK_ROWS = 2000
+
+def _file_tail_digest(path: Path, size: int = 65536) -> str:
+    """بصمة سريعة لنهاية الملف (آخر 64KB) للتأكد أنه لم يُعدّل منذ آخر تصدير."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - size))
+        return hashlib.sha256(f.read()).hexdigest()
+
+def export_current_worksheet_to_csv(dest_path=None, incremental=False):
     """
-    يحمّل كامل الورقة الحالية ويحفظها كـ CSV باسم:
+    يصدّر الورقة الحالية كـ CSV باسم:
     "<Spreadsheet Title> - <Worksheet Title>.csv"
     في نفس مجلد السكربت (أو داخل dest_path إذا كان مجلدًا)، مع الاستبدال عند وجود الملف.
+    الصفوف تُقرأ من مخزن المهام (_STORE) على دفعات (EXPORT_CHUNK_ROWS) وتُكتب مباشرة للقرص.
+    incremental=True: يضيف فقط الصفوف الجديدة إلى ملف موجود، اعتمادًا على ملف جانبي
+    "<csv>.state.json" (آخر صف + الحجم + بصمة النهاية)؛ وإن لم يتطابق يُعاد التصدير كاملًا.
     """
     ws = get_worksheet()
-    rows = ws.get_all_values()
 
     # تنظيف الأسماء من الأحرف غير الصالحة لأسماء الملفات
     def _safe(name: str) -> str:
@@ -152,193 +608,1449 @@ def export_current_worksheet_to_csv(dest_path=None):
     else:
         p = Path(dest_path)
         out_path = (p / filename) if p.is_dir() else p  # دعم تمرير مجلد أو مسار ملف كامل
+    state_path = out_path.with_name(out_path.name + ".state.json")
+
+    sheet_key = [RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE]
+    start_row, width = 1, None
+    if incremental and out_path.exists():
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+            if (state.get("sheet") == sheet_key
+                    and state.get("size") == out_path.stat().st_size
+                    and state.get("tail_sha256") == _file_tail_digest(out_path)):
+                start_row, width = int(state["rows"]) + 1, int(state["width"])
+        except Exception:
+            pass
 
-    # UTF-8 with BOM لتحسين التوافق مع Excel
-    with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
+    # مطابقة ذيل الشيت أولًا؛ بعدها كل الصفوف تُقرأ محليًا
+    _STORE.sync(ws)
+    # UTF-8 with BOM لتحسين التوافق مع Excel (عند الكتابة من البداية فقط)
+    mode, encoding = ("a", "utf-8") if start_row > 1 else ("w", "utf-8-sig")
+    last_row = start_row - 1
+    with open(out_path, mode, newline="", encoding=encoding) as f:
         writer = csv.writer(f)
-        writer.writerows(rows)
+        for last_row, row in _STORE.rows_after(start_row - 1):
+            if width is None:
+                width = max(len(row), len(HEADERS))
+            # get_all_values كان يُرجع صفوفًا متساوية الطول؛ نحافظ على نفس الشكل
+            writer.writerow(list(row) + [""] * (width - len(row)))
+
+    try:
+        state_path.write_text(json.dumps({
+            "sheet": sheet_key,
+            "rows": last_row,
+            "width": width,
+            "size": out_path.stat().st_size,
+            "tail_sha256": _file_tail_digest(out_path),
+        }), encoding="utf-8")
+    except Exception:
+        pass
 
     return str(out_path)
 
-# كاش لمعرّفات المهام الموجودة
-_TASK_IDS = None
+def task_id_exists(tid: str) -> bool:
+    """التحقّق من التكرار عبر مخزن المهام (استعلام مفهرس محليًا في الوضع الافتراضي)."""
+    return _STORE.has_task(tid)
 
-def _load_task_ids(ws=None):
-    """تحميل كل قيم العمود A (Task ID) كـ set في الكاش."""
-    global _TASK_IDS
-    if ws is None:
+
+_CFG_FILE = Path.home() / ".task_sheet_gui.json"
+# خيوط الواجهة والعمل الخلفي تعدّل نفس الملف؛ القراءة-التعديل-الكتابة تتمّ تحت هذا القفل
+_CFG_LOCK = threading.RLock()
+
+def _load_cfg() -> dict:
+    with _CFG_LOCK:
+        try:
+            if _CFG_FILE.exists():
+                return json.loads(_CFG_FILE.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+        return {}
+
+def _save_cfg(d: dict) -> None:
+    # الكتابة إلى ملف مؤقت ثم os.replace: القارئ يرى الملف القديم أو الجديد كاملًا، لا نصفه
+    with _CFG_LOCK:
+        tmp = _CFG_FILE.with_name(f"{_CFG_FILE.name}.{os.getpid()}.tmp")
+        try:
+            _CFG_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(d, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, _CFG_FILE)
+        except Exception:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+@contextmanager
+def _edit_cfg():
+    """قراءة-تعديل-كتابة ذرّية للإعدادات؛ لا تُكتب إن لم يتغيّر شيء."""
+    with _CFG_LOCK:
+        cfg = _load_cfg()
+        before = json.dumps(cfg, sort_keys=True)
+        yield cfg
+        if json.dumps(cfg, sort_keys=True) != before:
+            _save_cfg(cfg)
+
+
+# ===================== صندوق الإرسال المحلي (Outbox) =====================
+# كل مهمة تُحفظ أولًا في SQLite بجانب ملف الإعدادات (أجزاء من الثانية)،
+# ثم يفرّغها خيط خلفي إلى الورقة مع إعادة المحاولة؛ فلا تضيع عند انقطاع الشبكة أو إغلاق البرنامج.
+_DB_FILE = Path.home() / ".task_sheet_gui.sqlite3"
+
+# تجميع الإرسال: أقصى عدد صفوف في طلب append_rows واحد، وأقصى انتظار لتجميع صفوف متتالية
+OUTBOX_MAX_BATCH = 50
+OUTBOX_MAX_LINGER_SEC = 0.5
+
+# إن تغيّر عدد صفوف الشيت بشكل غير متوقّع (حذف يدوي)، نفحص هذا العدد من الصفوف قبل موضع الإضافة
+DUP_VERIFY_WINDOW = 200
+_DB = None
+_DB_LOCK = threading.RLock()
+
+_DB_VERSION = 2
+_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet_id   TEXT    NOT NULL,
+    worksheet  TEXT    NOT NULL,
+    task_id    TEXT    NOT NULL,
+    row_json   TEXT    NOT NULL,
+    state      TEXT    NOT NULL DEFAULT 'pending',  -- pending | sent | dup | failed
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL    NOT NULL,
+    sent_at    REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_by_state ON outbox (sheet_id, worksheet, state);
+CREATE INDEX IF NOT EXISTS outbox_by_tid ON outbox (task_id);
+
+DROP TABLE IF EXISTS task_ids;
+DROP TABLE IF EXISTS task_ids_meta;
+
+-- نسخة محلية من الورقة: صفوف الشيت (sheet_row) + مهام محفوظة هنا لم تُنسخ بعد (sheet_row NULL)
+CREATE TABLE IF NOT EXISTS task_rows (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet_id  TEXT    NOT NULL,
+    worksheet TEXT    NOT NULL,
+    sheet_row INTEGER,            -- رقم الصف في الشيت؛ NULL حتى يُنسخ
+    outbox_id INTEGER,            -- صف صندوق الإرسال الذي أنشأه (للمهام المُدخلة من هذا الجهاز)
+    task_id   TEXT    NOT NULL,
+    day       TEXT,               -- عمود Date (تاريخ عمّان)
+    hours     REAL    NOT NULL DEFAULT 0,
+    row_json  TEXT                -- NULL: لم تُجلب إلا الأعمدة أعلاه (تُكمَّل عند التصدير)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS task_rows_by_row ON task_rows (sheet_id, worksheet, sheet_row);
+CREATE INDEX IF NOT EXISTS task_rows_by_tid ON task_rows (sheet_id, worksheet, task_id);
+CREATE INDEX IF NOT EXISTS task_rows_by_day ON task_rows (sheet_id, worksheet, day);
+CREATE INDEX IF NOT EXISTS task_rows_by_outbox ON task_rows (outbox_id);
+CREATE TABLE IF NOT EXISTS task_rows_meta (
+    sheet_id     TEXT    NOT NULL,
+    worksheet    TEXT    NOT NULL,
+    synced_rows  INTEGER NOT NULL,  -- عدد صفوف الشيت (مع العناوين) المنسوخة محليًا
+    headers_json TEXT    NOT NULL,
+    seeded_on    TEXT    NOT NULL,  -- تاريخ آخر بناء كامل للنسخة؛ '' = أعد البناء (invalidate)
+    PRIMARY KEY (sheet_id, worksheet)
+);
+"""
+
+def _db() -> sqlite3.Connection:
+    """اتصال SQLite مشترك بين الخيوط (يُستخدم دائمًا داخل _DB_LOCK)."""
+    global _DB
+    with _DB_LOCK:
+        if _DB is None:
+            _DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(_DB_FILE), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # الصف يبقى حتى لو انهار الجهاز بعد الحفظ
+            if conn.execute("PRAGMA user_version").fetchone()[0] < _DB_VERSION:
+                # النسخة المحلية تُبنى من الشيت؛ إن تغيّر شكل جداولها تُحذف وتُعاد
+                conn.executescript("DROP TABLE IF EXISTS task_rows; DROP TABLE IF EXISTS task_rows_meta;")
+            conn.executescript(_DB_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {_DB_VERSION}")
+            _DB = conn
+        return _DB
+
+
+_READ_LOCAL = threading.local()
+
+def _read_db() -> sqlite3.Connection:
+    """
+    اتصال قراءة فقط خاص بالخيط الحالي، بلا _DB_LOCK: مع WAL لا ينتظر القارئ كاتبًا
+    (إعادة بناء النسخة المحلية تحمل القفل ثوانٍ)، فاستعلامات الواجهة الدورية لا تجمّدها.
+    """
+    conn = getattr(_READ_LOCAL, "conn", None)
+    if conn is None:
+        if _DB is None:
+            _db()  # أنشئ الملف والجداول أولًا
+        conn = sqlite3.connect(_DB_FILE.resolve().as_uri() + "?mode=ro", uri=True)
+        _READ_LOCAL.conn = conn
+    return conn
+
+
+def _outbox_insert(conn, sheet_id, worksheet, row_values) -> int:
+    """إضافة صف إلى صندوق الإرسال ضمن معاملة قائمة وإرجاع رقمه."""
+    tid = (row_values[0] or "").strip().lower()
+    cur = conn.execute(
+        "INSERT INTO outbox (sheet_id, worksheet, task_id, row_json, created_at) VALUES (?, ?, ?, ?, ?)",
+        (sheet_id, worksheet, tid, json.dumps(list(row_values), ensure_ascii=False), time.time()),
+    )
+    return cur.lastrowid
+
+
+def outbox_pending(sheet_id=None, worksheet=None, limit=None):
+    """الصفوف التي لم تُرسل بعد (الأقدم أولًا) كقائمة (id, row)."""
+    sheet_id = sheet_id or RUNTIME_SHEET_ID
+    worksheet = worksheet or RUNTIME_WORKSHEET_TITLE
+    sql = "SELECT id, row_json FROM outbox WHERE sheet_id=? AND worksheet=? AND state='pending' ORDER BY id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    with _DB_LOCK:
+        rows = _db().execute(sql, (sheet_id, worksheet)).fetchall()
+    return [(rid, json.loads(rj)) for rid, rj in rows]
+
+
+def outbox_counts(sheet_id=None, worksheet=None) -> dict:
+    """عدد الصفوف في كل حالة للورقة الحالية."""
+    sheet_id = sheet_id or RUNTIME_SHEET_ID
+    worksheet = worksheet or RUNTIME_WORKSHEET_TITLE
+    rows = _read_db().execute(
+        "SELECT state, COUNT(*) FROM outbox WHERE sheet_id=? AND worksheet=? GROUP BY state",
+        (sheet_id, worksheet),
+    ).fetchall()
+    return dict(rows)
+
+
+def _outbox_mark(ids, state, error=None):
+    if not ids:
+        return
+    with _DB_LOCK:
+        conn = _db()
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET state=?, attempts=attempts+1, last_error=?, sent_at=? WHERE id=?",
+                [(state, error, time.time() if state == "sent" else None, i) for i in ids],
+            )
+
+
+def _outbox_note_error(ids, error):
+    with _DB_LOCK:
+        conn = _db()
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET attempts=attempts+1, last_error=? WHERE id=?",
+                [(error, i) for i in ids],
+            )
+
+
+def outbox_retry(task_ids, sheet_id=None, worksheet=None) -> int:
+    """يعيد صفوف هذه المهام الفاشلة (failed) إلى الانتظار لتُرسل في الدفعة التالية."""
+    sheet_id = sheet_id or RUNTIME_SHEET_ID
+    worksheet = worksheet or RUNTIME_WORKSHEET_TITLE
+    with _DB_LOCK:
+        conn = _db()
+        with conn:
+            cur = conn.executemany(
+                "UPDATE outbox SET state='pending', last_error=NULL "
+                "WHERE sheet_id=? AND worksheet=? AND task_id=? AND state='failed'",
+                [(sheet_id, worksheet, tid) for tid in task_ids],
+            )
+    return cur.rowcount
+
+
+def _is_permanent_api_error(e: Exception) -> bool:
+    """أخطاء 4xx (عدا 408/429) لن تُصلحها إعادة المحاولة."""
+    resp = getattr(e, "response", None)
+    code = getattr(resp, "status_code", None)
+    return isinstance(e, gspread.exceptions.APIError) and code is not None and 400 <= code < 500 and code not in (408, 429)
+
+
+class OutboxFlusher:
+    """
+    خيط خلفي ينسخ صندوق الإرسال إلى الورقة الحالية، مع تأخير أُسّي عند الفشل.
+    store: النسخة المحلية (LocalTaskStore) التي تُحدَّث بأرقام الصفوف بعد كل إرسال.
+    """
+
+    RETRY_BASE_SEC = 2.0
+    RETRY_MAX_SEC = 300.0
+
+    def __init__(self, store, max_batch: int = OUTBOX_MAX_BATCH, max_linger: float = OUTBOX_MAX_LINGER_SEC):
+        self.store = store
+        self.max_batch = max(1, int(max_batch))
+        self.max_linger = max(0.0, float(max_linger))
+        self._urgent = threading.Event()   # flush(): أرسل فورًا بلا انتظار تجميع
+        self._wake = threading.Event()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self.last_error = None   # آخر خطأ شبكة/صلاحيات (للعرض فقط)
+        self.last_dup = None     # آخر Task ID اكتُشف تكراره أثناء الإرسال
+        # fn(counts, changes) يُستدعى من خيط الإرسال عند كل تغيّر (يضبطه App ليصل كحدث لخيط Tk)؛
+        # changes: {task_id: (state, last_error)} منذ الإشعار السابق
+        self.on_change = None
+        self._changes_lock = threading.Lock()
+        self._changes = {}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+            self._thread.start()
+        self.wake()
+
+    def wake(self):
+        self._wake.set()
+
+    def notify(self):
+        """يرسل إلى on_change عدّادات الصندوق والحالات التي تغيّرت (من أي خيط عدا خيط Tk)."""
+        with self._changes_lock:
+            changes, self._changes = self._changes, {}
+        fn = self.on_change
+        if fn is None:
+            return
+        try:
+            counts = outbox_counts()
+        except Exception:
+            return
+        fn(counts, changes)
+
+    def _record(self, batch, state, error=None):
+        with self._changes_lock:
+            for _, row in batch:
+                self._changes[(row[0] or "").strip().lower()] = (state, error)
+
+    def _mark(self, batch, state, error=None):
+        """_outbox_mark لعناصر (id، صف)، مع تسجيل حالتها للإشعار التالي."""
+        _outbox_mark([rid for rid, _ in batch], state, error)
+        self._record(batch, state, error)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """انتظر حتى يفرغ الصندوق (أو تنتهي المهلة). يعيد True إن لم يبقَ شيء معلّق."""
+        self._urgent.set()
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if not self._busy and not outbox_counts().get("pending"):
+                    return True
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(min(left, 0.5))
+
+    def _run(self):
+        failures = 0
+        while True:
+            delay = None if failures == 0 else min(self.RETRY_MAX_SEC, self.RETRY_BASE_SEC * (2 ** (failures - 1)))
+            self._wake.wait(timeout=delay)
+            self._wake.clear()
+            self.notify()  # صفوف أُضيفت أو أُعيدت للانتظار منذ آخر دورة
+            with self._cond:
+                self._busy = True
+            try:
+                self._linger()
+                self._drain()
+                failures = 0
+                self.last_error = None
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+                self.notify()
+
+    def _linger(self):
+        """انتظر قليلًا لتجميع الإرساليات المتتالية في دفعة واحدة (ما لم تمتلئ الدفعة)."""
+        deadline = time.monotonic() + self.max_linger
+        while not self._urgent.is_set():
+            left = deadline - time.monotonic()
+            if left <= 0 or len(outbox_pending(limit=self.max_batch)) >= self.max_batch:
+                return
+            self._wake.wait(timeout=left)
+            self._wake.clear()
+
+    def _drain(self):
+        self._urgent.clear()
+        if not RUNTIME_SHEET_ID or not RUNTIME_WORKSHEET_TITLE:
+            return
+        if not outbox_pending(limit=1):
+            return
         ws = get_worksheet()
-    vals = ws.col_values(1)[1:]  # تجاهل صفّ العناوين
-    _TASK_IDS = {v.strip().lower() for v in vals if v and v.strip()}
-    return _TASK_IDS
+        if not self.store.synced_rows():
+            self.store.sync(ws)
+        while True:
+            pending = outbox_pending(limit=self.max_batch)
+            if not pending:
+                return
+            # فحص محلي فقط قبل الكتابة؛ التحقق من التسابق يتمّ بعد الإضافة (_verify)
+            tids = [(row[0] or "").strip().lower() for _, row in pending]
+            in_sheet = self.store.replicated(tids)
+            batch, seen = [], set()
+            for (rid, row), tid in zip(pending, tids):
+                if tid in in_sheet or tid in seen:
+                    self._mark([(rid, row)], "dup")
+                    self.store.discard([rid])
+                    self.last_dup = tid
+                    continue
+                seen.add(tid)
+                batch.append((rid, row))
+            if batch:
+                # الإرسال والتحقق بعده هما ما ينتظره المستخدم؛ يتقدّمان على القراءات الخلفية
+                with sheets_priority(PRIO_USER):
+                    self._send(ws, batch)
+
+    def _send(self, ws, batch):
+        """إرسال دفعة بطلب append_rows واحد؛ عند رفض دائم نعزل الصف المسبّب بإرسال فردي."""
+        ids = [rid for rid, _ in batch]
+        rows = [to_sheet_order(row) for _, row in batch]
+        try:
+            resp = ws.append_rows(rows, value_input_option="USER_ENTERED")
+        except Exception as e:
+            if not _is_permanent_api_error(e):
+                _outbox_note_error(ids, str(e))
+                self._record(batch, "pending", str(e))
+                raise
+            if len(batch) == 1:
+                self._mark(batch, "failed", str(e))
+                return
+            for item in batch:
+                self._send(ws, [item])
+            return
 
-def task_id_exists(tid: str) -> bool:
-    """التحقّق السريع من التكرار من الكاش (ويُحمّل أول مرة عند الحاجة)."""
-    global _TASK_IDS
-    if _TASK_IDS is None:
-        _load_task_ids()
-    return tid.strip().lower() in _TASK_IDS
+        span = _updated_rows(resp)
+        dups = self._verify(ws, batch, span) if span else []
+        dup_ids = {rid for rid, _ in dups}
+        kept = [i for i in ids if i not in dup_ids]
+        self._mark([item for item in batch if item[0] not in dup_ids], "sent")
+        if span:
+            # حذف التكرارات أزاح صفوفنا الباقية لتتتالى من start
+            self.store.note_replicated(kept, span[0])
+        if dups:
+            self._mark(dups, "dup")
+            self.store.discard(list(dup_ids))
+            self.last_dup = (dups[-1][1][0] or "").strip().lower()
+
+    def _verify(self, ws, batch, span):
+        """
+        تحقّق مضاد للتسابق بعد الإضافة: نقرأ فقط الصفوف التي كتبها غيرنا بين آخر صف
+        تعرفه النسخة المحلية وموضع إضافتنا (وتدخل النسخة مباشرة). في الحالة الشائعة
+        (لا أحد كتب) لا توجد قراءة إطلاقًا.
+        إن وُجد Task ID من دفعتنا في تلك الصفوف، نحذف صفّنا (الأحدث) ونعيده كـ dup.
+        """
+        start, end = span
+        known_rows = self.store.synced_rows()
+        foreign = set()
+        if start != known_rows + 1 and start > 2:
+            tid_col = column_map()["Task ID"]
+            if known_rows + 1 < start:
+                last_col = _col_letter(max(ws.col_count, len(HEADERS)))
+                gap = ws.get(f"A{known_rows + 1}:{last_col}{start - 1}")
+                self.store.ingest(gap, known_rows + 1)
+            else:
+                # الشيت أقصر مما نعرف (حُذفت صفوف يدويًا): نافذة قبل الإضافة، ثم إعادة بناء النسخة
+                col = _col_letter(tid_col + 1)
+                gap = [[""] * tid_col + r for r in ws.get(f"{col}{max(2, start - DUP_VERIFY_WINDOW)}:{col}{start - 1}")]
+                self.store.invalidate()
+            foreign = {r[tid_col].strip().lower() for r in gap if len(r) > tid_col and r[tid_col].strip()}
 
-def register_task_id(tid: str):
-    """تحديث الكاش محليًا بعد نجاح الإضافة."""
-    global _TASK_IDS
-    if _TASK_IDS is None:
-        _TASK_IDS = set()
-    _TASK_IDS.add(tid.strip().lower())
+        dups = [(i, item) for i, item in enumerate(batch)
+                if (item[1][0] or "").strip().lower() in foreign]
+        # احذف من الأسفل للأعلى حتى لا تتغيّر أرقام الصفوف المتبقية
+        for i, _ in reversed(dups):
+            ws.delete_rows(start + i)
 
+        return [item for _, item in dups]
 
-_CFG_FILE = Path.home() / ".task_sheet_gui.json"
 
-def _load_cfg() -> dict:
+def _col_letter(col: int) -> str:
+    """رقم عمود (1-based) → حروفه في صيغة A1."""
+    return re.sub(r"\d+", "", gspread.utils.rowcol_to_a1(1, col))
+
+
+def _updated_rows(resp):
+    """(أول صف، آخر صف) من updatedRange في ردّ append_rows، أو None."""
     try:
-        if _CFG_FILE.exists():
-            return json.loads(_CFG_FILE.read_text(encoding="utf-8"))
+        rng = resp["updates"]["updatedRange"]
     except Exception:
-        pass
-    return {}
+        return None
+    m = re.search(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$", rng or "")
+    if not m:
+        return None
+    start = int(m.group(1))
+    return start, int(m.group(2) or start)
+
+
+# ===================== مخزن المهام =====================
+# أقصى عمر للنسخة المحلية قبل مطابقتها مع ذيل الشيت من جديد
+SYNC_TTL_SEC = 60
+
+# صفوف task_rows التي تُحتسب: صفوف الشيت والمهام المحلية ما لم يرفض الشيت إرسالها نهائيًا
+# (outbox.state='failed'؛ تعود للحساب إن أُعيدت للانتظار بـ outbox_retry)
+_LIVE_TASK_ROW = "(outbox_id IS NULL OR outbox_id NOT IN (SELECT id FROM outbox WHERE state='failed'))"
+
+def _row_day_hours(row, cols):
+    """(التاريخ المحلي، الساعات) من صف مهمة حسب column_map؛ (None، 0) للصفوف الناقصة."""
+    idx_date, idx_dur = cols["Date"], cols["Task duration (hour)"]
+    if len(row) <= max(idx_date, idx_dur):
+        return None, 0.0
+    day = str(row[idx_date]).strip() or None
+    try:
+        hours = float(str(row[idx_dur] or "0").strip() or 0)
+    except ValueError:
+        hours = 0.0
+    return day, hours
 
-def _save_cfg(d: dict) -> None:
+
+class TaskStore(ABC):
+    """
+    واجهة تخزين المهام التي تعتمد عليها الواجهة ونهاية اليوم (مخزن ناقص يفشل عند إنشائه).
+    LocalTaskStore (الافتراضي): SQLite هو المرجع للقراءة، والشيت نسخة تُكتب في الخلفية.
+    SheetsTaskStore: قراءة وكتابة الشيت مباشرة ("storage_backend": "sheets" في الإعدادات).
+    """
+
+    @abstractmethod
+    def add(self, row) -> None:
+        """حفظ صف مهمة جديدة."""
+
+    def add_many(self, rows) -> None:
+        """حفظ عدة صفوف مهام دفعة واحدة."""
+        for row in rows:
+            self.add(row)
+
+    @abstractmethod
+    def has_task(self, tid: str) -> bool:
+        """هل Task ID مسجّل مسبقًا؟"""
+
+    @abstractmethod
+    def task_ids(self) -> set:
+        """كل Task IDs المسجّلة (لفحص دفعات كبيرة محليًا، كالاستيراد)."""
+
+    @abstractmethod
+    def day_totals(self, day_iso: str):
+        """(عدد المهام، مجموع الساعات) لتاريخ محلي معيّن."""
+
+    @abstractmethod
+    def rows_after(self, row_no: int):
+        """يولّد (رقم الصف، الصف) لصفوف الورقة بعد الصف row_no بالترتيب (الصف 1 = العناوين)."""
+
+    def sync(self, ws=None, max_age=None) -> None:
+        """مطابقة مع الشيت إن لزم."""
+
+
+class SheetsTaskStore(TaskStore):
+    """
+    كل عملية طلب مباشر إلى الشيت، بلا نسخة محلية.
+    فحص التكرار وحده من مجموعة Task IDs مخزّنة مؤقتًا (عمود واحد، يُعاد تحميله كل SYNC_TTL_SEC
+    على الأكثر) تُضاف إليها المهام المُرسلة من هنا، فلا يُنزَّل العمود مع كل ضغطة مفاتيح.
+    """
+
+    def __init__(self):
+        self._ids_lock = threading.Lock()
+        self._ids = None          # (sheet_id, worksheet, set of Task IDs)
+        self._ids_at = float("-inf")
+
+    def add(self, row):
+        append_task_row(row)
+        self._remember([row[0]])
+
+    def add_many(self, rows):
+        rows = list(rows)
+        for i in range(0, len(rows), IMPORT_CHUNK_ROWS):
+            append_task_rows(rows[i:i + IMPORT_CHUNK_ROWS])
+            self._remember(r[0] for r in rows[i:i + IMPORT_CHUNK_ROWS])
+
+    def _remember(self, tids):
+        with self._ids_lock:
+            if self._ids is not None:
+                self._ids[2].update((t or "").strip().lower() for t in tids)
+
+    def sync(self, ws=None, max_age=None):
+        """يعيد تحميل عمود Task ID إن كانت المجموعة المخزّنة أقدم من max_age (افتراضيًا SYNC_TTL_SEC)."""
+        if max_age is None:
+            max_age = SYNC_TTL_SEC
+        key = (RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE)
+        with self._ids_lock:
+            if (self._ids is not None and self._ids[:2] == key
+                    and time.monotonic() - self._ids_at < max_age):
+                return
+            col = column_map()["Task ID"] + 1
+            values = (ws or get_worksheet()).col_values(col)[1:]
+            self._ids = (*key, {v.strip().lower() for v in values if v.strip()})
+            self._ids_at = time.monotonic()
+
+    def has_task(self, tid):
+        self.sync()
+        with self._ids_lock:
+            return tid.strip().lower() in self._ids[2]
+
+    def task_ids(self):
+        self.sync()
+        with self._ids_lock:
+            return set(self._ids[2])
+
+    def day_totals(self, day_iso):
+        # عمودا التاريخ والمدة فقط في طلب واحد (بلا نصوص prompt/justification/feedback)
+        cols = column_map()
+        d, h = (_col_letter(cols[name] + 1) for name in ("Date", "Task duration (hour)"))
+        dates, durations = get_worksheet().batch_get([f"{d}2:{d}", f"{h}2:{h}"])
+        pair = {"Date": 0, "Task duration (hour)": 1}
+        count, hours = 0, 0.0
+        for i, dv in enumerate(dates):
+            hv = durations[i] if i < len(durations) else []
+            day, dur = _row_day_hours([dv[0] if dv else "", hv[0] if hv else ""], pair)
+            if day == day_iso:
+                count += 1
+                hours += dur
+        return count, hours
+
+    def rows_after(self, row_no):
+        ws = get_worksheet()
+        last_col = _col_letter(max(ws.col_count, len(HEADERS)))
+        row_no += 1
+        while True:
+            chunk = ws.get(f"A{row_no}:{last_col}{row_no + EXPORT_CHUNK_ROWS - 1}")
+            for row in chunk:
+                yield row_no, row
+                row_no += 1
+            if len(chunk) < EXPORT_CHUNK_ROWS:
+                return
+
+
+class LocalTaskStore(TaskStore):
+    """
+    نسخة محلية من الورقة في SQLite (task_rows) هي المرجع للقراءة:
+    التكرار وإحصائيات اليوم والتصدير استعلامات مفهرسة بلا شبكة.
+    - المهمة الجديدة تُحفظ في task_rows وصندوق الإرسال بمعاملة واحدة؛ ينسخها _OUTBOX إلى الشيت.
+    - صفوف الآخرين تُسحب من ذيل الشيت (بعد آخر صف معروف فقط) مرة كل SYNC_TTL_SEC على الأكثر.
+    - البناء الكامل (أول مرة، أو عند اكتشاف عدم اتساق: تغيّر العناوين، شيت أقصر مما نعرف،
+      أو Task ID لا يطابق صفّه) يقرأ أعمدة Task ID/Date/المدة فقط؛ بقية خلايا تلك الصفوف
+      تُجلب عند أول تصدير يحتاجها. النسخة تبقى عبر الأيام فلا يُعاد تنزيل الشيت مع كل تشغيل.
+    """
+
+    def __init__(self):
+        self._sync_lock = threading.Lock()
+        self._synced_at = {}   # (sheet_id, worksheet) → آخر مطابقة (time.monotonic)
+
+    @staticmethod
+    def _key():
+        key = (RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE)
+        if not all(key):
+            raise RuntimeError("Sheet ID/Worksheet title are not set yet.")
+        return key
+
+    @staticmethod
+    def _meta(key):
+        with _DB_LOCK:
+            r = _db().execute(
+                "SELECT synced_rows, headers_json, seeded_on FROM task_rows_meta WHERE sheet_id=? AND worksheet=?", key
+            ).fetchone()
+        return None if r is None else {"synced_rows": r[0], "headers": json.loads(r[1]), "seeded_on": r[2]}
+
+    @staticmethod
+    def _insert(conn, key, row, cols, sheet_row=None, outbox_id=None, partial=False):
+        day, hours = _row_day_hours(row, cols)
+        tid = row[cols["Task ID"]] if len(row) > cols["Task ID"] else ""
+        conn.execute(
+            "INSERT INTO task_rows (sheet_id, worksheet, sheet_row, outbox_id, task_id, day, hours, row_json)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*key, sheet_row, outbox_id, str(tid).strip().lower(), day, hours,
+             None if partial else json.dumps(list(row), ensure_ascii=False)),
+        )
+
+    def _ingest(self, conn, key, rows, first_row, headers, partial=False):
+        """
+        صفوف مقروءة من الشيت: تُربط بمهمة محلية لم تُنسخ بعد (نفس Task ID) أو تُضاف كصف جديد.
+        partial=True: الصفوف تحوي الأعمدة المفهرسة فقط (row_json يبقى NULL).
+        """
+        cols = column_map(headers)
+        tid_col = cols["Task ID"]
+        known = {r[0] for r in conn.execute(
+            "SELECT sheet_row FROM task_rows WHERE sheet_id=? AND worksheet=? AND sheet_row>=?", (*key, first_row))}
+        unsent = {r[0] for r in conn.execute(
+            "SELECT task_id FROM task_rows WHERE sheet_id=? AND worksheet=? AND sheet_row IS NULL", key)}
+        for n, row in enumerate(rows, start=first_row):
+            if n in known:
+                continue  # سجّله خيط الإرسال أثناء قراءتنا
+            tid = str(row[tid_col] if len(row) > tid_col else "").strip().lower()
+            if tid in unsent:
+                unsent.discard(tid)
+                day, hours = _row_day_hours(row, cols)
+                conn.execute(
+                    "UPDATE task_rows SET sheet_row=?, day=?, hours=?, row_json=? WHERE id=("
+                    "SELECT id FROM task_rows WHERE sheet_id=? AND worksheet=? AND task_id=? AND sheet_row IS NULL LIMIT 1)",
+                    (n, day, hours, None if partial else json.dumps(list(row), ensure_ascii=False), *key, tid),
+                )
+                continue
+            self._insert(conn, key, row, cols, sheet_row=n, partial=partial)
+
+    def _seed(self, ws, key, today_iso, headers=None):
+        # العناوين + أعمدة Task ID/Date/المدة فقط في طلب batch_get واحد
+        names = ("Task ID", "Date", "Task duration (hour)")
+        headers = headers or sheet_headers() or list(HEADERS)
+        for _ in range(2):
+            cols = column_map(headers)
+            letters = [_col_letter(cols[n] + 1) for n in names]
+            header_vr, *columns = ws.batch_get(["1:1"] + [f"{c}2:{c}" for c in letters])
+            got = _trim_headers(header_vr[0] if header_vr else [])
+            if not got or got == headers:
+                break
+            headers = got  # تغيّر ترتيب الأعمدة منذ آخر مرة: أعد القراءة بالترتيب الجديد
+        remember_headers(headers)
+
+        nrows = max((len(c) for c in columns), default=0)
+        width = max(cols[n] for n in names) + 1
+        rows = []
+        for i in range(nrows):
+            row = [""] * width
+            for n, col in zip(names, columns):
+                if i < len(col) and col[i]:
+                    row[cols[n]] = col[i][0]
+            rows.append(row)
+
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                # صفوف الشيت تُبنى من جديد؛ المهام المحلية التي لم تُنسخ تبقى وتُربط إن وُجدت
+                conn.execute("DELETE FROM task_rows WHERE sheet_id=? AND worksheet=? AND sheet_row IS NOT NULL", key)
+                self._ingest(conn, key, rows, 2, headers, partial=True)
+                conn.execute(
+                    "INSERT OR REPLACE INTO task_rows_meta (sheet_id, worksheet, synced_rows, headers_json, seeded_on)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (*key, nrows + 1, json.dumps(headers, ensure_ascii=False), today_iso),
+                )
+
+    def _hydrate(self, key, meta, page):
+        """
+        يكمّل صفوف الصفحة التي لم تُجلب إلا أعمدتها المفهرسة بقراءة نطاقها كاملًا من الشيت
+        (مرة واحدة؛ تبقى محليًا للتصديرات التالية). إن لم تطابق Task IDs تُعاد بناء النسخة لاحقًا.
+        """
+        first, last = page[0][0], page[-1][0]
+        last_col = _col_letter(max(len(meta["headers"]), len(HEADERS)))
+        fetched = get_worksheet().get(f"A{first}:{last_col}{last}")
+        tid_col = column_map(meta["headers"])["Task ID"]
+        out, fills, stale = [], [], False
+        for n, rj, tid in page:
+            if rj is None:
+                row = list(fetched[n - first]) if n - first < len(fetched) else []
+                stale |= str(row[tid_col] if len(row) > tid_col else "").strip().lower() != tid
+                rj = json.dumps(row, ensure_ascii=False)
+                fills.append((rj, *key, n))
+            out.append((n, rj))
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                conn.executemany(
+                    "UPDATE task_rows SET row_json=? WHERE sheet_id=? AND worksheet=? AND sheet_row=?", fills)
+        if stale:
+            self.invalidate()
+        return out
+
+    def sync(self, ws=None, max_age=None):
+        """
+        مطابقة النسخة المحلية مع الشيت: بناء كامل أول مرة (أو بعد invalidate)، ثم قراءة ذيل
+        الصفوف الجديدة فقط. لا طلبات إطلاقًا إن كانت آخر مطابقة أحدث من max_age (افتراضيًا SYNC_TTL_SEC).
+        """
+        if max_age is None:
+            max_age = SYNC_TTL_SEC
+        key = self._key()
+        today_iso = datetime.now(JO_TZ).strftime("%Y-%m-%d")
+        with self._sync_lock:
+            meta = self._meta(key)
+            need_seed = meta is None or not meta["seeded_on"]
+            if not need_seed and time.monotonic() - self._synced_at.get(key, float("-inf")) < max_age:
+                return
+            if ws is None:
+                ws = get_worksheet()
+            if need_seed:
+                self._seed(ws, key, today_iso)
+            else:
+                # صف العناوين وآخر صف معروف يُقرآن مع الذيل في نفس الطلب: إن تغيّر ترتيب الأعمدة
+                # أو لم يعد آخر صف معروف هو نفسه (صفوف حُذفت/أُدرجت يدويًا) يُعاد البناء
+                last = meta["synced_rows"]
+                start = max(2, last)
+                ncols = max(len(meta["headers"]), len(HEADERS))
+                header_vr, tail = ws.batch_get(["1:1", f"A{start}:{_col_letter(ncols)}"])
+                headers = _trim_headers(header_vr[0] if header_vr else [])
+                if headers != meta["headers"]:
+                    self._seed(ws, key, today_iso, headers)  # أعمدة نُقلت/أُضيفت: أعد البناء بالترتيب الجديد
+                elif start == last and not self._same_row(key, last, tail[0] if tail else [], headers):
+                    self._seed(ws, key, today_iso, headers)
+                else:
+                    self.ingest(tail[last + 1 - start:], last + 1)
+            self._synced_at[key] = time.monotonic()
+
+    @staticmethod
+    def _same_row(key, row_no, row, headers):
+        """هل صف الشيت row_no ما زال يحمل Task ID المسجّل له محليًا؟ (صف غير معروف محليًا يُعدّ مطابقًا)"""
+        tid_col = column_map(headers)["Task ID"]
+        tid = str(row[tid_col] if len(row) > tid_col else "").strip().lower()
+        with _DB_LOCK:
+            r = _db().execute(
+                "SELECT task_id FROM task_rows WHERE sheet_id=? AND worksheet=? AND sheet_row=?", (*key, row_no)
+            ).fetchone()
+        return r is None or r[0] == tid
+
+    def ingest(self, rows, first_row):
+        """إدخال صفوف مقروءة من الشيت تبدأ بالصف first_row، وتقديم آخر صف معروف إن اتصلت به."""
+        key = self._key()
+        meta = self._meta(key)
+        if meta is None:
+            return
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                self._ingest(conn, key, rows, first_row, meta["headers"])
+                conn.execute(
+                    "UPDATE task_rows_meta SET synced_rows=MAX(synced_rows, ?)"
+                    " WHERE sheet_id=? AND worksheet=? AND synced_rows>=?",
+                    (first_row - 1 + len(rows), *key, first_row - 1),
+                )
+
+    def invalidate(self):
+        """أجبر إعادة البناء الكامل في المطابقة القادمة (مثلًا بعد حذف صفوف من الشيت يدويًا)."""
+        key = self._key()
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                conn.execute("UPDATE task_rows_meta SET seeded_on='' WHERE sheet_id=? AND worksheet=?", key)
+
+    # ---- واجهة التخزين ----
+    def add(self, row):
+        self.add_many([row])
+
+    def add_many(self, rows):
+        key = self._key()
+        cols = column_map(HEADERS)  # الصفوف المحلية بترتيب HEADERS؛ تُرتّب حسب الورقة عند الإرسال والنسخ (note_replicated)
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                for row in rows:
+                    self._drop_failed(conn, key, (row[0] or "").strip().lower())
+                    oid = _outbox_insert(conn, *key, row)
+                    self._insert(conn, key, row, cols, outbox_id=oid)
+
+    @staticmethod
+    def _drop_failed(conn, key, tid):
+        """إدخال جديد لنفس Task ID يحلّ محلّ محاولة سابقة رفضها الشيت نهائيًا: تُحذف هي ونسختها."""
+        ids = [(r[0],) for r in conn.execute(
+            "SELECT id FROM outbox WHERE sheet_id=? AND worksheet=? AND task_id=? AND state='failed'", (*key, tid))]
+        if ids:
+            conn.executemany("DELETE FROM task_rows WHERE outbox_id=? AND sheet_row IS NULL", ids)
+            conn.executemany("DELETE FROM outbox WHERE id=?", ids)
+
+    def has_task(self, tid):
+        key = self._key()
+        if self._meta(key) is None:
+            self.sync()  # أول مرة لهذه الورقة: بناء النسخة المحلية
+        with _DB_LOCK:
+            return _db().execute(
+                f"SELECT 1 FROM task_rows WHERE sheet_id=? AND worksheet=? AND task_id=? AND {_LIVE_TASK_ROW} LIMIT 1",
+                (*key, tid.strip().lower()),
+            ).fetchone() is not None
+
+    def task_ids(self):
+        key = self._key()
+        if self._meta(key) is None:
+            self.sync()
+        with _DB_LOCK:
+            return {r[0] for r in _db().execute(
+                f"SELECT DISTINCT task_id FROM task_rows WHERE sheet_id=? AND worksheet=? AND {_LIVE_TASK_ROW}", key)}
+
+    def day_totals(self, day_iso):
+        with _DB_LOCK:
+            count, hours = _db().execute(
+                f"SELECT COUNT(*), TOTAL(hours) FROM task_rows WHERE sheet_id=? AND worksheet=? AND day=? AND {_LIVE_TASK_ROW}",
+                (*self._key(), day_iso),
+            ).fetchone()
+        return count, hours
+
+    def rows_after(self, row_no):
+        key = self._key()
+        meta = self._meta(key)
+        if meta is None:
+            return
+        if row_no < 1:
+            yield 1, meta["headers"]
+            row_no = 1
+        while True:
+            with _DB_LOCK:
+                page = _db().execute(
+                    "SELECT sheet_row, row_json, task_id FROM task_rows WHERE sheet_id=? AND worksheet=?"
+                    " AND sheet_row>? AND sheet_row<=? ORDER BY sheet_row LIMIT ?",
+                    (*key, row_no, meta["synced_rows"], EXPORT_CHUNK_ROWS),
+                ).fetchall()
+            rows = (self._hydrate(key, meta, page) if any(rj is None for _, rj, _ in page)
+                    else [(n, rj) for n, rj, _ in page])
+            for n, rj in rows:
+                yield n, json.loads(rj)
+            if len(page) < EXPORT_CHUNK_ROWS:
+                return
+            row_no = page[-1][0]
+
+    # ---- النسخ إلى الشيت (يستدعيها _OUTBOX) ----
+    def synced_rows(self) -> int:
+        """عدد صفوف الشيت (مع العناوين) المنسوخة محليًا؛ 0 إن لم تُبنَ النسخة بعد."""
+        meta = self._meta(self._key())
+        return meta["synced_rows"] if meta else 0
+
+    def replicated(self, tids) -> set:
+        """أيّ من المعرّفات المعطاة موجود فعلًا في الشيت حسب النسخة المحلية."""
+        key = self._key()
+        with _DB_LOCK:
+            conn = _db()
+            return {t for t in tids if conn.execute(
+                "SELECT 1 FROM task_rows WHERE sheet_id=? AND worksheet=? AND task_id=? AND sheet_row IS NOT NULL LIMIT 1",
+                (*key, t),
+            ).fetchone()}
+
+    def note_replicated(self, outbox_ids, start):
+        """
+        صفوف الصندوق هذه كُتبت بالترتيب بدءًا من الصف start.
+        الصف المحلي محفوظ بترتيب HEADERS؛ يصبح صف شيت فيُعاد ترتيبه حسب أعمدة الورقة (للتصدير).
+        """
+        key = self._key()
+        meta = self._meta(key)
+        headers = meta["headers"] if meta else None
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                updates = []
+                for i, rid in enumerate(outbox_ids):
+                    r = conn.execute("SELECT row_json FROM task_rows WHERE outbox_id=?", (rid,)).fetchone()
+                    rj = r[0] if r else None
+                    if rj is not None:
+                        rj = json.dumps(to_sheet_order(json.loads(rj), headers), ensure_ascii=False)
+                    updates.append((start + i, rj, rid))
+                conn.executemany(
+                    "UPDATE OR REPLACE task_rows SET sheet_row=?, row_json=? WHERE outbox_id=?", updates
+                )
+                conn.execute(
+                    "UPDATE task_rows_meta SET synced_rows=? WHERE sheet_id=? AND worksheet=? AND synced_rows=?",
+                    (start + len(outbox_ids) - 1, *key, start - 1),
+                )
+
+    def discard(self, outbox_ids):
+        """مهام رفضها الإرسال كتكرار: تُحذف محليًا (ويبقى صف الشيت الأصلي إن رُبطت به)."""
+        with _DB_LOCK:
+            conn = _db()
+            with conn:
+                conn.executemany("DELETE FROM task_rows WHERE outbox_id=? AND sheet_row IS NULL",
+                                 [(i,) for i in outbox_ids])
+                conn.executemany("UPDATE task_rows SET outbox_id=NULL WHERE outbox_id=?", [(i,) for i in outbox_ids])
+
+
+_LOCAL_STORE = LocalTaskStore()
+_STORE = SheetsTaskStore() if _load_cfg().get("storage_backend") == "sheets" else _LOCAL_STORE
+
+# صندوق الإرسال ينسخ دائمًا إلى الشيت ما حُفظ في النسخة المحلية (بما فيه ما بقي من جلسات سابقة)
+_OUTBOX = OutboxFlusher(
+    _LOCAL_STORE,
+    max_batch=_load_cfg().get("outbox_max_batch", OUTBOX_MAX_BATCH),
+    max_linger=_load_cfg().get("outbox_max_linger_sec", OUTBOX_MAX_LINGER_SEC),
+)
+
+
+def today_stats(day_iso: str):
+    """
+    (عدد المهام، مجموع الساعات، stale) ليوم محلي بعد مطابقة المخزن مع الشيت.
+    بلا اتصال تُعاد القيم المحلية (تشمل المهام التي لم تصل للشيت بعد) مع stale=True
+    لأن مهام الآخرين الأحدث لم تُقرأ. يُستدعى من خيط خلفي.
+    """
     try:
-        _CFG_FILE.parent.mkdir(parents=True, exist_ok=True)
-        _CFG_FILE.write_text(json.dumps(d, ensure_ascii=False, indent=2), encoding="utf-8")
+        _STORE.sync()
+        stale = False
     except Exception:
-        pass
+        stale = True
+    return (*_STORE.day_totals(day_iso), stale)
 
 
 def compute_today_hours_from_current_sheet() -> float:
     """
     مجموع ساعات اليوم بالتاريخ المحلي (عمّان):
     يجمع 'Task duration (hour)' لكل صف تاريخه في عمود 'Date' يساوي تاريخ اليوم (عمّان).
+    يُقرأ من مخزن المهام (_STORE) بعد مطابقة ذيل الشيت، بدل تنزيل الورقة كاملة.
     """
-    ws = get_worksheet()
-    values = ws.get_all_values()
-    if not values:
-        return 0.0
-
-    headers = values[0]
-    try:
-        idx_duration = headers.index("Task duration (hour)")
-        idx_date_loc = headers.index("Date")  # التاريخ المحلي
-    except ValueError:
-        return 0.0
-
+    _STORE.sync()
     today_local = datetime.now(JO_TZ).strftime("%Y-%m-%d")
-    total = 0.0
-    for row in values[1:]:
-        if len(row) <= max(idx_duration, idx_date_loc):
-            continue
-        if row[idx_date_loc].strip() == today_local:
-            try:
-                total += float((row[idx_duration] or "0").strip() or 0)
-            except Exception:
-                pass
-    return total
+    return _STORE.day_totals(today_local)[1]
 
 
-def _open_external_spreadsheet():
-    # نفس منطق get_worksheet تمامًا لالتقاط ملف الاعتماد
-    creds_path = _get_service_account_path_from_env_or_cfg()
-    if not creds_path:
-        creds_path = filedialog.askopenfilename(
-            title="اختر ملف Google Service Account JSON",
-            filetypes=[("JSON files", "*.json")]
-        )
-        if not creds_path:
-            raise RuntimeError("لم يتم اختيار ملف الخدمة (Service Account).")
+# كاش لمقبض الشيت الخارجي وأوراقه (نفس العميل والاتصالات المشتركة)
+_EXT_SH = None
+_EXT_WS = {}
 
-    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    gc = gspread.authorize(creds)
+def _open_external_spreadsheet(creds_path=None):
+    global _EXT_SH
+    if _EXT_SH is None:
+        _EXT_WS.clear()
+        _EXT_SH = get_client(creds_path).open_by_key(EXTERNAL_SHEET_ID)
+    return _EXT_SH
 
-    # احفظ المسار في الإعدادات إذا لم يأتِ من المتغير البيئي
-    try:
-        if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-            cfg = _load_cfg()
-            cfg["service_account_file"] = creds_path
-            _save_cfg(cfg)
-    except Exception:
-        pass
+def _external_worksheet(title: str):
+    """ورقة من الشيت الخارجي (worksheet() يجلب بيانات الملف في كل استدعاء، لذا نحفظها)."""
+    sh = _open_external_spreadsheet()
+    ws = _EXT_WS.get(title)
+    if ws is None:
+        ws = _EXT_WS[title] = sh.worksheet(title)
+    return ws
 
-    return gc.open_by_key(EXTERNAL_SHEET_ID)
 
+# إحداثيات خلية اليوم التي تأكّدنا منها في هذه الجلسة (date, row, col)
+_DAILY_CELL_VERIFIED = None
 
-def update_daily_hours_in_external_sheet(total_hours_today: float) -> bool:
+def _locate_daily_cell(ws, today_col_title, cached_row=None):
     """
-    يحدّث خلية ساعات اليوم في ورقة Daily Hours (بالتاريخ المحلي).
-    يكتب فقط إذا تغيّرت القيمة عن الموجودة حاليًا.
-    يعيد True إذا تمّ التحديث، False إذا لم تتغير القيمة.
+    يحدّد (صف، عمود) خلية اليوم ويعيد أيضًا الكتابات اللازمة لإنشاء العنوان/الاسم إن غابا.
+    مع صف محفوظ: نقرأ الصف 1 وخلية الاسم فقط؛ وإلا الصف 1 والعمود A (طلب batch_get واحد).
     """
-    sh = _open_external_spreadsheet()
-    ws = sh.worksheet(DAILY_HOURS_SHEET)
-
-    data = ws.get_all_values()
-    if not data:
-        ws.append_row(["Name"])  # تهيئة رأس بسيط
-        data = ws.get_all_values()
+    if cached_row:
+        header_vr, name_vr = ws.batch_get(["1:1", f"A{cached_row}"])
+        name_ok = bool(name_vr) and bool(name_vr[0]) and name_vr[0][0].strip() == PERSON_FULLNAME_FOR_DAILY
+        if not name_ok:
+            return _locate_daily_cell(ws, today_col_title)
+        names = None
+    else:
+        header_vr, names_vr = ws.batch_get(["1:1", "A:A"])
+        names = [(r[0].strip() if r else "") for r in names_vr]
+    headers = list(header_vr[0]) if header_vr else []
 
-    headers = data[0] if data else ["Name"]
-    today_col_title = datetime.now(JO_TZ).strftime("%Y/%m/%d")  # yyyy/mm/dd (محلي)
+    updates = []
+    if not any(headers):
+        headers = ["Name"]  # تهيئة رأس بسيط
+        updates.append({"range": "A1", "values": [["Name"]]})
+        if names is not None:
+            names = names or ["Name"]
 
     # الحصول/إنشاء عمود التاريخ
     try:
         col_idx = headers.index(today_col_title) + 1  # 1-based
     except ValueError:
-        ws.update_cell(1, len(headers) + 1, today_col_title)
         col_idx = len(headers) + 1
-        headers.append(today_col_title)
+        updates.append({"range": gspread.utils.rowcol_to_a1(1, col_idx), "values": [[today_col_title]]})
 
     # الحصول/إنشاء صف الاسم في العمود A
-    target_row_idx = None
-    for r, row in enumerate(data[1:], start=2):
-        if (row and row[0].strip()) == PERSON_FULLNAME_FOR_DAILY:
-            target_row_idx = r
-            break
-    if target_row_idx is None:
-        target_row_idx = len(data) + 1
-        ws.update_cell(target_row_idx, 1, PERSON_FULLNAME_FOR_DAILY)
-
-    # القراءة الحالية للمقارنة (قد تكون فارغة)
-    current_val = ws.cell(target_row_idx, col_idx).value or ""
-    try:
-        current_float = float(current_val)
-    except Exception:
-        current_float = None
+    if names is None:
+        target_row_idx = cached_row
+    else:
+        try:
+            target_row_idx = names.index(PERSON_FULLNAME_FOR_DAILY, 1) + 1
+        except ValueError:
+            target_row_idx = len(names) + 1
+            updates.append({"range": f"A{target_row_idx}", "values": [[PERSON_FULLNAME_FOR_DAILY]]})
+    return target_row_idx, col_idx, updates
+
+def _verify_daily_cell(ws, today_col_title, row, col) -> bool:
+    """تحقّق بطلب واحد أن خلية الاسم وعنوان العمود المحفوظين ما زالا في مكانهما."""
+    name_vr, header_vr = ws.batch_get([f"A{row}", gspread.utils.rowcol_to_a1(1, col)])
+    def _val(vr):
+        return vr[0][0].strip() if vr and vr[0] else ""
+    return _val(name_vr) == PERSON_FULLNAME_FOR_DAILY and _val(header_vr) == today_col_title
+
+def update_daily_hours_in_external_sheet(total_hours_today: float) -> bool:
+    """
+    يحدّث خلية ساعات اليوم في ورقة Daily Hours (بالتاريخ المحلي).
+    إحداثيات الخلية محفوظة على القرص (daily_hours_cell): بعد أول تحقّق في الجلسة يكون التحديث
+    كتابة واحدة بلا بحث؛ ويُعاد البحث فقط إذا فشل التحقّق.
+    يكتب فقط إذا تغيّرت القيمة عن آخر قيمة كتبناها لليوم.
+    يعيد True إذا تمّ التحديث، False إذا لم تتغير القيمة.
+    """
+    global _DAILY_CELL_VERIFIED
+    today_col_title = datetime.now(JO_TZ).strftime("%Y/%m/%d")  # yyyy/mm/dd (محلي)
+    new_text = f"{round(float(total_hours_today), 2):.2f}"
+
+    cfg = _load_cfg()
+    last = cfg.get("daily_hours_last") or {}
+    if last.get("date") == today_col_title and last.get("value") == new_text:
+        return False
 
-    new_val = round(float(total_hours_today), 2)
+    ws = _external_worksheet(DAILY_HOURS_SHEET)
 
-    # اكتب فقط إذا اختلفت
-    if current_float is None or abs(current_float - new_val) > 1e-6:
-        ws.update_cell(target_row_idx, col_idx, f"{new_val:.2f}")
-        return True
-    return False
+    cell = cfg.get("daily_hours_cell") or {}
+    if cell.get("sheet") != EXTERNAL_SHEET_ID:
+        cell = {}
+    updates = []
+    if cell.get("date") == today_col_title and cell.get("row") and cell.get("col"):
+        row, col = cell["row"], cell["col"]
+        if _DAILY_CELL_VERIFIED != (today_col_title, row, col) and not _verify_daily_cell(ws, today_col_title, row, col):
+            row, col, updates = _locate_daily_cell(ws, today_col_title)
+    else:
+        # يوم جديد: صف الاسم غالبًا لم يتغيّر، فنبحث فقط عن عمود اليوم
+        row, col, updates = _locate_daily_cell(ws, today_col_title, cached_row=cell.get("row"))
+
+    updates.append({"range": gspread.utils.rowcol_to_a1(row, col), "values": [[new_text]]})
+    ws.batch_update(updates, value_input_option="USER_ENTERED")
+    _DAILY_CELL_VERIFIED = (today_col_title, row, col)
+
+    with _edit_cfg() as cfg:
+        cfg["daily_hours_last"] = {"date": today_col_title, "value": new_text}
+        cfg["daily_hours_cell"] = {"sheet": EXTERNAL_SHEET_ID, "date": today_col_title, "row": row, "col": col}
+    return True
+
+# عدد صفوف WFH الأخيرة التي نفحصها لمنع التكرار (الورقة مشتركة وتكبر مع الفريق)
+WFH_TAIL_WINDOW = 500
 
 def upsert_wfh_row_if_needed(total_hours_today: float) -> bool:
     """
     إذا (ساعات اليوم المحلي > 7) أضف صفًا واحدًا فقط في WFH:
     [الاسم، تاريخ اليوم المحلي بصيغة yyyy-mm-dd].
+    التواريخ التي أضفناها تُحفظ محليًا (wfh_posted)، فالحالة الشائعة بلا أي قراءة؛
+    وإلا نقرأ العمودين A:B لآخر WFH_TAIL_WINDOW صفًا فقط.
     يعيد True إذا أضيف الصف، False خلاف ذلك.
     """
     if total_hours_today <= 7.0:
         return False
 
-    sh = _open_external_spreadsheet()
-    ws = sh.worksheet(WFH_SHEET)
-
-    values = ws.get_all_values()
     today_iso = datetime.now(JO_TZ).strftime("%Y-%m-%d")
+    cfg = _load_cfg()
+    memo = cfg.get("wfh_posted") or {}
+    if memo.get("sheet") != EXTERNAL_SHEET_ID:
+        memo = {"sheet": EXTERNAL_SHEET_ID, "dates": [], "last_row": 0}
+    if today_iso in memo["dates"]:
+        return False  # أضفناه سابقًا
+
+    def _remember(last_row):
+        memo["dates"] = sorted(set(memo["dates"]) | {today_iso})[-60:]
+        memo["last_row"] = max(int(memo.get("last_row") or 0), last_row)
+        with _edit_cfg() as cfg:
+            cfg["wfh_posted"] = memo
+
+    ws = _external_worksheet(WFH_SHEET)
+
+    # نافذة الذيل: من آخر صف نعرفه (أو من حجم الشبكة إن لم نعرف) وحتى نهاية البيانات
+    last_known = int(memo.get("last_row") or 0) or ws.row_count
+    start = max(2, last_known - WFH_TAIL_WINDOW + 1)
+    values = ws.get(f"A{start}:B")
+    if not values and start > 2:
+        # الشبكة أكبر من البيانات ولا نعرف آخر صف بعد: قراءة A:B كاملة لمرة واحدة فقط
+        start = 1
+        values = ws.get("A:B")
 
     # منع التكرار لنفس اليوم
-    for row in values[1:]:
+    for row in values:
         name = (row[0].strip() if len(row) > 0 else "")
         d    = (row[1].strip() if len(row) > 1 else "")
         if name == PERSON_NAME_FOR_WFH and d == today_iso:
+            _remember(start + len(values) - 1)
             return False  # موجود مسبقًا
 
-    ws.append_row([PERSON_NAME_FOR_WFH, today_iso], value_input_option="USER_ENTERED")
+    resp = ws.append_row([PERSON_NAME_FOR_WFH, today_iso], value_input_option="USER_ENTERED")
+    span = _updated_rows(resp)
+    _remember(span[1] if span else start + len(values))
     return True
 
 
 
+# ===================== الاتصال والتسخين =====================
+def connect_and_warm_up(creds_path):
+    """
+    يتصل بالورقة الحالية ويسخّن بالتوازي كل ما يحتاجه النموذج:
+    النسخة المحلية (Task IDs وإحصائيات اليوم) ومقبض الشيت الخارجي.
+    creds_path يُحدَّد مسبقًا على خيط الواجهة (قد يتطلّب نافذة اختيار ملف).
+    """
+    get_client(creds_path)  # أنشئ العميل المشترك مرة واحدة قبل أن تستخدمه الخيوط
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup") as pool:
+        # الشيت الخارجي لا يعتمد على الورقة الحالية؛ يبدأ فورًا
+        f_ext = pool.submit(_open_external_spreadsheet, creds_path)
+        with sheets_priority(PRIO_USER):
+            ws = get_worksheet(creds_path)
+        try:
+            pool.submit(_STORE.sync, ws).result()
+        except Exception as e:
+            # غير ضروري لفتح النموذج: has_task/today_stats يطابقان من جديد عند الحاجة
+            print(f"تعذّر تسخين النسخة المحلية: {e}", file=sys.stderr)
+        try:
+            f_ext.result()
+        except Exception:
+            pass  # غير ضروري لبدء العمل؛ يُعاد المحاولة عند الحاجة
+    # ابدأ تفريغ صندوق الإرسال (بما فيه أي صفوف بقيت من جلسة سابقة)
+    _OUTBOX.start()
+    return ws
+
+
+# ===================== خطوات نهاية اليوم =====================
+# (المفتاح، العنوان المعروض) بالترتيب الذي يظهر في واجهة التقدّم
+FINISH_STEPS = [
+    ("outbox", "إرسال المهام المعلّقة"),
+    ("export", "حفظ نسخة CSV"),
+    ("hours",  "حساب ساعات اليوم"),
+    ("daily",  "تحديث Daily Hours"),
+    ("wfh",    "تحديث WFH"),
+]
+
+def run_finish_of_day(save_csv: bool, report) -> dict:
+    """
+    يشغّل خطوات نهاية اليوم على مجمّع خيوط؛ الخطوات المستقلة تعمل بالتوازي:
+    outbox ← (export ∥ hours) ← (daily ∥ wfh).
+    report(step, state, payload) يُستدعى من خيوط العمل بالحالات: run / ok / err / skip.
+    يعيد {step: Future}.
+    """
+    pool = ThreadPoolExecutor(max_workers=len(FINISH_STEPS), thread_name_prefix="finish")
+
+    def step(name, fn, *deps):
+        def _run():
+            try:
+                args = [d.result() for d in deps]
+            except Exception:
+                report(name, "skip", None)  # فشلت خطوة يعتمد عليها
+                raise
+            report(name, "run", None)
+            try:
+                res = fn(*args)
+            except Exception as e:
+                report(name, "err", str(e))
+                raise
+            report(name, "ok", res)
+            return res
+        return pool.submit(_run)
+
+    # أرسل ما تبقّى في صندوق الإرسال أولًا حتى تشمله الحسابات والتصدير
+    futures = {"outbox": step("outbox", lambda: _OUTBOX.flush(timeout=30))}
+    if save_csv:
+        futures["export"] = step("export", lambda _: export_current_worksheet_to_csv(incremental=True), futures["outbox"])
+    else:
+        report("export", "skip", None)
+    futures["hours"] = step("hours", lambda _: compute_today_hours_from_current_sheet(), futures["outbox"])
+    futures["daily"] = step("daily", update_daily_hours_in_external_sheet, futures["hours"])
+    futures["wfh"]   = step("wfh", upsert_wfh_row_if_needed, futures["hours"])
+    pool.shutdown(wait=False)
+    return futures
+
+
+# ===================== الاستيراد من سطر الأوامر =====================
+# صفوف في كل طلب append_rows أثناء الاستيراد (~1MB لكل طلب مع نصوص طويلة)
+IMPORT_CHUNK_ROWS = 200
+
+IMPORT_FIELDS = ("task_id", "prompt", "justification", "feedback", "rating", "project",
+                 "duration_hours", "level", "verdict", "started_at", "submitted_at", "ot")
+
+def _read_import_records(path):
+    """
+    يولّد (رقم السطر، سجل) من CSV (صف عناوين بأسماء IMPORT_FIELDS) أو JSONL (كائن لكل سطر).
+    سطر JSONL لا يُقرأ كـ JSON يُولَّد مع خطأ القراءة (ValueError) بدل السجل، ليُبلَّغ عنه ويُتخطّى.
+    """
+    p = Path(path)
+    if p.suffix.lower() in (".jsonl", ".ndjson"):
+        with open(p, encoding="utf-8") as f:
+            for n, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield n, json.loads(line)
+                    except ValueError as e:
+                        yield n, e
+    else:
+        with open(p, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            for rec in reader:
+                yield reader.line_num, rec
+
+def _parse_when(value) -> datetime:
+    """وقت ISO 8601؛ بلا منطقة زمنية يُعتبر بتوقيت عمّان."""
+    dt = datetime.fromisoformat(str(value).strip())
+    return dt.replace(tzinfo=JO_TZ) if dt.tzinfo is None else dt
+
+def prepare_import_rows(records):
+    """
+    يتحقق من السجلات ويبني صفوفها بـ build_task_row:
+    Task ID يطابق HEX24_RE وغير موجود في المخزن ولا مكرر في الملف، rating رقم صحيح أو فارغ،
+    submitted_at (وstarted_at اختياريًا) بصيغة ISO 8601. duration_hours الفارغة = الفرق بين الوقتين.
+    يعيد (الصفوف، [(رقم السطر، السبب)]).
+    """
+    rows, errors, seen = [], [], set()
+    existing = _STORE.task_ids()  # مرة واحدة للاستيراد كله بدل طلب لكل سجل
+    for line, rec in records:
+        if isinstance(rec, ValueError):
+            errors.append((line, f"JSON غير صالح: {rec}"))
+            continue
+        if not isinstance(rec, dict):
+            errors.append((line, f"السطر يجب أن يكون كائن JSON، لا {type(rec).__name__}"))
+            continue
+        rec = {str(k).strip().lower(): v for k, v in rec.items() if k is not None}
+        tid = str(rec.get("task_id") or "").strip().lower()
+        rating = str(rec.get("rating") or "").strip()
+        if not HEX24_RE.fullmatch(tid):
+            errors.append((line, f"Task ID يجب أن يطابق ^[0-9a-f]{{24}}$: {tid!r}"))
+            continue
+        if tid in seen or tid in existing:
+            errors.append((line, f"Task ID موجود مسبقًا: {tid}"))
+            continue
+        if rating and not rating.isdigit():
+            errors.append((line, f"rating يجب أن يكون رقمًا صحيحًا: {rating!r}"))
+            continue
+        try:
+            submitted = _parse_when(rec.get("submitted_at"))
+            started = _parse_when(rec["started_at"]) if str(rec.get("started_at") or "").strip() else submitted
+            duration = str(rec.get("duration_hours") or "").strip()
+            duration = float(duration) if duration else (submitted - started).total_seconds() / 3600
+        except (TypeError, ValueError) as e:
+            errors.append((line, f"وقت أو مدة غير صالحة: {e}"))
+            continue
+        seen.add(tid)
+        ot = str(rec.get("ot") or "").strip() or None
+        rows.append(build_task_row(
+            tid, rec.get("prompt"), rec.get("justification"), rec.get("feedback"), rating,
+            rec.get("project"), duration, rec.get("level"), rec.get("verdict"),
+            started_at=started, submitted_at=submitted, ot=ot,
+        ))
+    return rows, errors
+
+def run_import(args) -> int:
+    """استيراد مهام من ملف إلى الورقة بلا واجهة. يعيد رمز الخروج (0 = كل السجلات أُضيفت)."""
+    global RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE
+    cfg = _load_cfg()
+    RUNTIME_SHEET_ID = args.sheet_id or cfg.get("sheet_id")
+    RUNTIME_WORKSHEET_TITLE = args.worksheet or cfg.get("worksheet")
+    creds_path = args.creds or _get_service_account_path_from_env_or_cfg()
+    if not RUNTIME_SHEET_ID or not RUNTIME_WORKSHEET_TITLE:
+        raise SystemExit("حدّد --sheet-id و --worksheet (أو احفظهما من الواجهة أولًا).")
+    if not creds_path:
+        raise SystemExit("حدّد --creds أو GOOGLE_APPLICATION_CREDENTIALS.")
+
+    ws = get_worksheet(creds_path)
+    _STORE.sync(ws)
+    rows, errors = prepare_import_rows(_read_import_records(args.file))
+    for line, reason in errors:
+        print(f"{args.file}:{line}: {reason}", file=sys.stderr)
+    if args.dry_run:
+        print(f"صالح: {len(rows)}، مرفوض: {len(errors)} (بلا كتابة)")
+        return 1 if errors else 0
+
+    if rows:
+        # كل دفعة من صندوق الإرسال = طلب append_rows واحد
+        _OUTBOX.max_batch = IMPORT_CHUNK_ROWS
+        _OUTBOX.max_linger = 0.0
+        _STORE.add_many(rows)
+        if not _OUTBOX.flush(timeout=args.timeout):
+            print(f"لم يكتمل الإرسال ({_OUTBOX.last_error or 'انتهت المهلة'}); "
+                  "الصفوف محفوظة محليًا وتُرسل في التشغيل القادم.", file=sys.stderr)
+            return 2
+    print(f"أُضيفت {len(rows)} مهمة، ورُفض {len(errors)} سجل.")
+    return 1 if errors else 0
+
+def main(argv=None) -> int:
+    """بلا أوامر: الواجهة الرسومية. "import <file>": استيراد دفعي بلا واجهة."""
+    ap = argparse.ArgumentParser(description="Task Sheet GUI / headless bulk import")
+    sub = ap.add_subparsers(dest="command")
+    imp = sub.add_parser("import", help="استيراد مهام من CSV/JSONL بلا واجهة")
+    imp.add_argument("file", help="CSV بعناوين " + ",".join(IMPORT_FIELDS) + " أو JSONL بنفس المفاتيح")
+    imp.add_argument("--sheet-id", help="افتراضيًا آخر Sheet ID محفوظ")
+    imp.add_argument("--worksheet", help="افتراضيًا آخر Worksheet محفوظة")
+    imp.add_argument("--creds", help="ملف Service Account JSON")
+    imp.add_argument("--dry-run", action="store_true", help="تحقق وبناء الصفوف فقط")
+    imp.add_argument("--timeout", type=float, default=300.0, help="أقصى انتظار للإرسال بالثواني")
+    args = ap.parse_args(argv)
+
+    if args.command == "import":
+        return run_import(args)
+    app = App()
+    app.mainloop()
+    return 0
+
+
 # ===================== الواجهة =====================
+# مهلة تجميع ضغطات المفاتيح/اللصق قبل فحص تكرار Task ID في الخلفية
+TID_CHECK_DEBOUNCE_MS = 150
+# هامش بعد حدّ الثانية حتى لا تسبق نبضة after() الثانيةَ الجديدة بجزء من الملّي
+TICK_SLACK_MS = 5
+# أقصى عدد مهام في قائمة "قيد الإرسال" (الوضع المتتابع)؛ الأقدم المنتهية تُزال أولًا
+PIPELINE_STATUS_MAX = 8
+
+
+class UiTicker:
+    """
+    نبضة واحدة مركزية لكل أعمال الواجهة الدورية (الساعات، التاريخان، المؤقّت).
+    - استدعاء after() واحد معلّق فقط مهما تعدّدت الاشتراكات أو تكرّر عرض الصفحات.
+    - كل نبضة تُجدول على حدّ الثانية التالية من ساعة النظام، فلا يتراكم انحراف.
+    - تتوقف تلقائيًا عند عدم وجود مشتركين.
+    """
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._subs = {}          # key -> fn(now_ts)
+        self._job = None
+        self._texts = {}         # آخر نص دُفع لكل ليبل
+
+    def subscribe(self, key: str, fn) -> None:
+        # نفس المفتاح يستبدل الاشتراك السابق بدل إضافة سلسلة جديدة
+        self._subs[key] = fn
+        if self._job is None:
+            self._schedule()
+
+    def unsubscribe(self, key: str) -> None:
+        self._subs.pop(key, None)
+        if not self._subs and self._job is not None:
+            try:
+                self._widget.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+
+    def _schedule(self) -> None:
+        frac = time.time() % 1.0
+        delay = int((1.0 - frac) * 1000) + TICK_SLACK_MS
+        self._job = self._widget.after(delay, self._tick)
+
+    def _tick(self) -> None:
+        self._job = None
+        now = time.time()
+        for fn in list(self._subs.values()):
+            try:
+                fn(now)
+            except Exception:
+                pass
+        if self._subs:
+            self._schedule()
+
+    def set_text(self, widget, text: str) -> None:
+        """يحدّث نص الليبل فقط عند تغيّره (لا إعادة رسم بلا داعٍ)."""
+        key = str(widget)
+        if self._texts.get(key) != text:
+            self._texts[key] = text
+            widget.configure(text=text)
+
+
+# عدد خيوط أعمال الواجهة الخلفية (إضافة، إحصائيات، فحص تكرار، اتصال)
+UI_WORKERS = 4
+
+
+class UiExecutor:
+    """
+    منفّذ خلفي مشترك للواجهة: العمل على مجمّع خيوط، والنتيجة تعود لخيط Tk فورًا
+    عبر حدث افتراضي (<<UiCallback>>) بدل مؤقّتات after() تفحص طوابير، فلا استهلاك للمعالج أثناء الخمول.
+    """
+
+    EVENT = "<<UiCallback>>"
+
+    def __init__(self, root):
+        self._root = root
+        self._pool = ThreadPoolExecutor(max_workers=UI_WORKERS, thread_name_prefix="ui-bg")
+        self._calls = queue.SimpleQueue()
+        root.bind(self.EVENT, self._drain)
+
+    def submit(self, fn, *args, on_done=None):
+        """يشغّل fn(*args) في الخلفية؛ on_done(future) يُستدعى على خيط Tk عند الانتهاء."""
+        fut = self._pool.submit(fn, *args)
+        if on_done is not None:
+            fut.add_done_callback(lambda f: self.post(on_done, f))
+        return fut
+
+    def post(self, fn, *args) -> None:
+        """آمن من أي خيط: يجدول fn(*args) على خيط Tk."""
+        self._calls.put((fn, args))
+        try:
+            self._root.event_generate(self.EVENT, when="tail")
+        except (RuntimeError, tk.TclError):
+            pass  # النافذة أُغلقت
+
+    def _drain(self, event=None):
+        # حدث واحد قد يغطي عدة نداءات؛ الأحداث الزائدة تجد الطابور فارغًا
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception:
+                self._root.report_callback_exception(*sys.exc_info())
+
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -408,6 +2120,11 @@ class App(tk.Tk):
         # شريط الحالة
         self.status = tk.StringVar(value="")
 
+        # نبضة الثانية المشتركة لكل الصفحات
+        self.ticker = UiTicker(self)
+        # الأعمال الخلفية ونتائجها (بدون استطلاع)
+        self.bg = UiExecutor(self)
+
         # تهيئة الصفحات
         self.frames = {}
         for F in (StartPage, SheetConfigPage, TaskFormPage, PostAddPage):
@@ -425,14 +2142,27 @@ class App(tk.Tk):
         view_menu.add_cascade(label="الثيمات (TTK)", menu=themes_menu)
         view_menu.add_separator()
         view_menu.add_command(label="تبديل الوضع الليلي/النهاري", command=self._toggle_dark)
+        view_menu.add_separator()
+        view_menu.add_command(label="التشخيص (Diagnostics)", command=self._open_diagnostics)
 
         menubar.add_cascade(label="عرض", menu=view_menu)
         self.config(menu=menubar)
 
+        # حالة صندوق الإرسال تصل من خيطه كحدث (لا استطلاع SQLite على خيط Tk)
+        _OUTBOX.on_change = lambda counts, changes: self.bg.post(
+            self.frames["TaskFormPage"].on_outbox_change, counts, changes)
+
+        self._shown = None
         self.show_frame("StartPage")
 
     def show_frame(self, name):
         frame = self.frames[name]
+        if self._shown is not None and self._shown is not frame:
+            try:
+                self._shown.event_generate("<<HidePage>>")
+            except Exception:
+                pass
+        self._shown = frame
         frame.tkraise()
         try:
             frame.event_generate("<<ShowPage>>")
@@ -441,8 +2171,7 @@ class App(tk.Tk):
 
     def _ot_default_for_weekday(self, wd: int) -> str:
         # Mon=0 .. Sun=6 (Python weekday)
-        # الافتراضي Yes على Fri(4), Sat(5)؛ غير ذلك No
-        return "Yes" if wd in (4, 5) else "No"
+        return ot_default_for_weekday(wd)
 
     def _current_la_now(self):
         return datetime.now(LA_TZ)
@@ -527,6 +2256,57 @@ class App(tk.Tk):
 
 
 
+    # -------- نافذة التشخيص ----------
+    def _open_diagnostics(self):
+        """نافذة تعرض زمن وحجم طلبات Sheets لكل عملية (p50/p95) مع التصدير."""
+        win = getattr(self, "_diag_win", None)
+        if win is not None and win.winfo_exists():
+            win.lift()
+            return
+        win = self._diag_win = tk.Toplevel(self)
+        win.title("Diagnostics - Google Sheets API")
+        win.geometry("900x420")
+
+        cols = ("op", "target", "count", "p50_ms", "p95_ms", "total_ms", "rows", "kb", "errors")
+        titles = ("Operation", "Target", "Calls", "p50 (ms)", "p95 (ms)", "Total (ms)", "Rows", "KB", "Errors")
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        for c, t in zip(cols, titles):
+            tree.heading(c, text=t)
+            tree.column(c, width=220 if c == "target" else 90, anchor="w" if c in ("op", "target") else "e")
+        tree.pack(fill="both", expand=True, padx=8, pady=8)
+
+        def _refresh():
+            tree.delete(*tree.get_children())
+            for r in _TRACE.summary():
+                tree.insert("", "end", values=(
+                    r["op"], r["target"], r["count"], r["p50_ms"], r["p95_ms"], r["total_ms"],
+                    r["rows"], f"{r['bytes'] / 1024:.1f}", r["errors"],
+                ))
+
+        def _export():
+            path = filedialog.asksaveasfilename(
+                parent=win, title="تصدير سجلّ الطلبات", defaultextension=".json",
+                filetypes=[("JSON", "*.json"), ("CSV", "*.csv")],
+            )
+            if not path:
+                return
+            try:
+                _TRACE.export(path)
+                messagebox.showinfo("تم", f"تم حفظ السجلّ:\n{path}", parent=win)
+            except Exception as e:
+                messagebox.showerror("خطأ", f"تعذّر الحفظ:\n{e}", parent=win)
+
+        def _clear():
+            _TRACE.clear()
+            _refresh()
+
+        btns = ttk.Frame(win)
+        btns.pack(pady=(0, 8))
+        ttk.Button(btns, text="تحديث", command=_refresh).grid(row=0, column=0, padx=4)
+        ttk.Button(btns, text="تصدير JSON/CSV", command=_export).grid(row=0, column=1, padx=4)
+        ttk.Button(btns, text="مسح", command=_clear).grid(row=0, column=2, padx=4)
+        _refresh()
+
     # -------- التحكم بالثيم ----------
     def _set_theme(self, name: str):
         try:
@@ -640,13 +2420,18 @@ class SheetConfigPage(tk.Frame):
 
         form.columnconfigure(1, weight=1)
 
-        ttk.Button(self, text="التالي", command=self.on_next).pack(pady=16)
+        self.btn_next = ttk.Button(self, text="التالي", command=self.on_next)
+        self.btn_next.pack(pady=(16, 4))
+
+        # مؤشر انتظار أثناء الاتصال في الخلفية
+        self.spinner = ttk.Progressbar(self, mode="indeterminate", length=220)
+        self.var_connect = tk.StringVar(value="")
+        self.lbl_connect = ttk.Label(self, textvariable=self.var_connect)
 
         def _clear_saved_service_file():
-            cfg = _load_cfg()
-            if "service_account_file" in cfg:
-                cfg.pop("service_account_file", None)
-                _save_cfg(cfg)
+            with _edit_cfg() as cfg:
+                had = cfg.pop("service_account_file", None) is not None
+            if had:
                 messagebox.showinfo("تم", "تم مسح مسار ملف الخدمة المحفوظ. سيُطلب منك اختياره عند الاتصال القادم.")
 
         ttk.Button(self, text="مسح ملف الخدمة المحفوظ", command=_clear_saved_service_file).pack(pady=(4, 0))
@@ -654,10 +2439,9 @@ class SheetConfigPage(tk.Frame):
         # زر لمسح الإعدادات المحفوظة
         def _clear_saved():
             try:
-                cfg = _load_cfg()
-                for k in ("sheet_id", "worksheet"):
-                    cfg.pop(k, None)
-                _save_cfg(cfg)
+                with _edit_cfg() as cfg:
+                    for k in ("sheet_id", "worksheet"):
+                        cfg.pop(k, None)
                 self.var_sheet_id.set("")
                 self.var_ws_title.set("")
                 messagebox.showinfo("تم", "تم مسح الإعدادات المحفوظة.")
@@ -694,23 +2478,48 @@ class SheetConfigPage(tk.Frame):
             return
 
         try:
-            global RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE, _WS, _TASK_IDS
-            RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE = sid, wst
-            _WS = None
-            _TASK_IDS = None
-            get_worksheet()
-            # حفظ آخر قيم ناجحة
-            try:
-                cfg = _load_cfg()
-                cfg["sheet_id"] = sid
-                cfg["worksheet"] = wst
-                _save_cfg(cfg)
-            except Exception:
-                pass
+            # اختيار ملف الخدمة (إن لزم) يجب أن يتمّ على خيط الواجهة
+            creds_path = _resolve_creds_path()
+        except Exception as e:
+            messagebox.showerror("فشل الاتصال", f"تعذّر فتح الورقة:\n{e}")
+            return
+
+        global RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE, _WS
+        RUNTIME_SHEET_ID, RUNTIME_WORKSHEET_TITLE = sid, wst
+        _WS = None
+
+        # الاتصال والتسخين في الخلفية مع مؤشر انتظار
+        self.btn_next.configure(state="disabled")
+        self.var_connect.set("جارٍ الاتصال وتجهيز النموذج…")
+        self.spinner.pack(pady=(4, 0))
+        self.lbl_connect.pack()
+        self.spinner.start(12)
+
+        self.controller.bg.submit(
+            connect_and_warm_up, creds_path,
+            on_done=lambda fut: self._on_connected(fut, sid, wst),
+        )
+
+    def _on_connected(self, fut, sid, wst):
+        self.spinner.stop()
+        self.spinner.pack_forget()
+        self.lbl_connect.pack_forget()
+        self.btn_next.configure(state="normal")
+
+        try:
+            fut.result()
         except Exception as e:
             messagebox.showerror("فشل الاتصال", f"تعذّر فتح الورقة:\n{e}")
             return
 
+        # حفظ آخر قيم ناجحة
+        try:
+            with _edit_cfg() as cfg:
+                cfg["sheet_id"] = sid
+                cfg["worksheet"] = wst
+        except Exception:
+            pass
+
         # تأكد من منطق OT قبل الانتقال
         self.controller._maybe_rollover_ot_with_prompt(self)
         self.controller.show_frame("TaskFormPage")
@@ -722,7 +2531,10 @@ class TaskFormPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
-        self._clock_job = None
+        # حالة مؤقّت المهمة (تُعرض عبر نبضة controller.ticker)
+        self._timer_running = False
+        self._t0 = None
+        self._elapsed_base = 0.0
 
         # الجديد:
         hdr_box = ttk.Frame(self)
@@ -974,13 +2786,57 @@ class TaskFormPage(tk.Frame):
             justify="right"
         ).pack(anchor="e", pady=(4, 0))
 
+        # حالة صندوق الإرسال المحلي (صفوف لم تصل للشيت بعد)
+        self.var_outbox = tk.StringVar(value="")
+        ttk.Label(
+            stats_box,
+            textvariable=self.var_outbox,
+            anchor="e",
+            justify="right"
+        ).pack(anchor="e", pady=(4, 0))
+
         # زر إعادة تعيين المؤقت تحت زر إضافة المهمة مباشرة
         self.btn_reset_timer = ttk.Button(
             buttons, text="إعادة تعيين المؤقت", command=self.on_reset_timer)
         self.btn_reset_timer.grid(row=1, column=1, padx=8, pady=(6, 0))
 
-        # صفّ اتصالات للخيط الخلفي + مؤشر تحميل
-        self._q = queue.Queue()
+        # الوضع المتتابع: الإضافة تكتمل في الخلفية والنموذج يُفرَّغ فورًا للمهمة التالية
+        self.var_pipelined = tk.BooleanVar(value=bool(_load_cfg().get("pipelined")))
+        ttk.Checkbutton(
+            buttons, text="وضع متتابع (بدون انتظار الإرسال)",
+            variable=self.var_pipelined, command=self._on_toggle_pipelined
+        ).grid(row=2, column=1, padx=8, pady=(6, 0))
+        # بدون صفحة ما بعد الإضافة يبقى إنهاء العمل متاحًا من هنا
+        self.btn_finish_day = ttk.Button(
+            buttons, text="إنهاء العمل…", command=self.on_finish_day)
+        self.btn_finish_day.grid(row=0, column=2, padx=8)
+
+        # قائمة المهام المرسلة في الوضع المتتابع وحالة كل منها (tid -> {row, state, error})
+        self._inflight = {}
+        self.inflight_box = ttk.Labelframe(self, text="المهام قيد الإرسال", style="Card.TLabelframe")
+        self.tree_inflight = ttk.Treeview(
+            self.inflight_box, columns=("tid", "state"), show="headings", height=4, selectmode="browse")
+        self.tree_inflight.heading("tid", text="Task ID")
+        self.tree_inflight.heading("state", text="الحالة")
+        self.tree_inflight.column("tid", width=260, anchor="w")
+        self.tree_inflight.column("state", width=320, anchor="e")
+        self.tree_inflight.pack(side="left", fill="x", expand=True)
+        self.tree_inflight.bind("<<TreeviewSelect>>", lambda e: self._update_retry_state())
+        self.btn_retry = ttk.Button(
+            self.inflight_box, text="إعادة المحاولة", command=self.on_retry_inflight, state="disabled")
+        self.btn_retry.pack(side="left", padx=(8, 0))
+        self.inflight_box.grid(row=6, column=0, columnspan=4, sticky="we", padx=8, pady=(0, 8))
+        self.inflight_box.grid_remove()
+        self._apply_pipelined_mode()
+
+        # تحديث الإحصائيات في الخلفية: آخر قيم معروفة (اليوم، العدد، الساعات) وحالة الخيط
+        self._stats_last = None
+        self._stats_busy = False
+        self._stats_again = False
+        # فحص تكرار Task ID في الخلفية: النتائج لكل معرّف (True = غير مكرر) والفحوص الجارية
+        self._tid_unique = {}
+        self._tid_checking = set()
+        self._tid_job = None
         self.prog = ttk.Progressbar(self, length=220)
         self.prog.grid(row=5, column=0, columnspan=4, pady=(0, 8))
         self.prog.grid_remove()  # مخفي افتراضياً
@@ -991,6 +2847,7 @@ class TaskFormPage(tk.Frame):
 
         # عند عرض الصفحة: تعبئة افتراضية وتحديث حالة الزر
         self.bind("<<ShowPage>>", self.on_show)
+        self.bind("<<HidePage>>", self.on_hide)
 
     # مساعد لإطلاق حدث العرض عند العودة للصفحة
     def event_generate_show(self):
@@ -1009,10 +2866,10 @@ class TaskFormPage(tk.Frame):
         # منطق OT (يتكفّل بالافتراضيات والتنبيه عند دخول يوم جديد)
         self.controller._maybe_rollover_ot_with_prompt(self)
 
-        # واجهة
+        # واجهة (نتائج فحص التكرار السابقة قد تغيّرت بإضافات جديدة)
+        self._tid_unique.clear()
         self._update_add_state()
-        self._update_header_dates()
-        
+
         try:
             ws = get_worksheet()
             ss_title = ws.spreadsheet.title
@@ -1021,23 +2878,19 @@ class TaskFormPage(tk.Frame):
         except Exception:
             self.sheet_where_lbl.configure(text="الكتابة الآن على: (لم يتم الاتصال بعد)")
 
-        # تشغيل ساعات العرض (اليمين/اليسار)
-        if getattr(self, "_clock_job", None):
-            try:
-                self.after_cancel(self._clock_job)
-            except Exception:
-                pass
-
-        # احفظ وقت بداية المهمة (محلي)
-        jo = JO_TZ
-        self.task_start_local = datetime.now(jo).strftime("%H:%M")
+        # احفظ وقت بداية المهمة (يُكتب في الصف محليًا وبتوقيت لوس أنجلِس)
+        self.task_started_at = datetime.now(JO_TZ)
 
-        # احفظ أيضًا وقت البداية بتوقيت لوس أنجلِس (اختياري)
-        la = LA_TZ
-        self.task_start_us = datetime.now(la).strftime("%H:%M")
-
-        self._tick_clocks()
+        # ساعات العرض والمؤقّت: اشتراك واحد (إعادة العرض تستبدله ولا تضيف سلسلة)
+        self.controller.ticker.subscribe("task_form", self._on_tick)
+        self._on_tick(time.time())
         self._refresh_daily_stats_from_sheet()
+        # لقطة أولى لسطر الطابور؛ التحديثات التالية تصل من _OUTBOX عند كل تغيّر
+        self.controller.bg.submit(_OUTBOX.notify)
+
+    def on_hide(self, event=None):
+        # لا نبضات لصفحة غير معروضة (المؤقّت يحسب من perf_counter فلا يتأثر)
+        self.controller.ticker.unsubscribe("task_form")
 
 
 
@@ -1063,13 +2916,8 @@ class TaskFormPage(tk.Frame):
         ok_tid    = bool(HEX24_RE.fullmatch(tid))
         ok_rating = (rating == "") or rating.isdigit()
 
-        # تحقّق تكرار Task ID من الكاش
-        ok_unique = True
-        if ok_tid:
-            try:
-                ok_unique = not task_id_exists(tid)
-            except Exception:
-                ok_unique = True
+        # تكرار Task ID: نتيجة الفحص الخلفي إن وصلت (الإرسال يعيد الفحص على أي حال)
+        ok_unique = self._tid_unique.get(tid) is not False if ok_tid else True
 
         # تلوين الحقول
         rating_widget = getattr(self, "cmb_rating", None)
@@ -1091,9 +2939,41 @@ class TaskFormPage(tk.Frame):
 
 
     def _update_add_state(self, *args):
-        """تفعيل زر الإضافة فقط عندما تتحقق القواعد أعلاه."""
+        """
+        تفعيل زر الإضافة فقط عندما تتحقق القواعد أعلاه.
+        فحص التكرار لا يتمّ هنا: يُجدوَل في الخلفية بعد توقّف الكتابة، والزر معطّل حتى تصل نتيجته.
+        """
         can_enable = self._validate_all(show_msg=False)
-        self.btn_add.config(state="normal" if can_enable else "disabled")
+        tid = self.var_task_id.get().strip().lower()
+        checking = bool(HEX24_RE.fullmatch(tid)) and tid not in self._tid_unique
+        if checking:
+            self._schedule_tid_check()
+        self.btn_add.config(state="normal" if can_enable and not checking else "disabled")
+
+    def _schedule_tid_check(self):
+        if self._tid_job is not None:
+            self.after_cancel(self._tid_job)
+        self._tid_job = self.after(TID_CHECK_DEBOUNCE_MS, self._start_tid_check)
+
+    def _start_tid_check(self):
+        self._tid_job = None
+        tid = self.var_task_id.get().strip().lower()
+        if not HEX24_RE.fullmatch(tid) or tid in self._tid_unique or tid in self._tid_checking:
+            return
+        self._tid_checking.add(tid)
+        self.controller.bg.submit(
+            task_id_exists, tid, on_done=lambda fut: self._on_tid_checked(tid, fut)
+        )
+
+    def _on_tid_checked(self, tid, fut):
+        try:
+            unique = not fut.result()
+        except Exception:
+            unique = True  # لا نمنع الإدخال بسبب خطأ شبكة؛ الإرسال يعيد الفحص
+        self._tid_checking.discard(tid)
+        self._tid_unique[tid] = unique
+        if tid == self.var_task_id.get().strip().lower():
+            self._update_add_state()
    
 
     def _set_busy(self, busy: bool):
@@ -1120,29 +3000,24 @@ class TaskFormPage(tk.Frame):
         except tk.TclError: pass
 
     def _worker_append(self, row):
+        """يعمل على خيط خلفي؛ يعيد (الحالة، الحمولة): ok/ws أو dup/tid أو err/رسالة."""
         try:
             ws = get_worksheet()
-            # تحقّق نهائي مضاد لظروف التسابق: اقرأ العمود A من الشيت مباشرة
-            existing = {v.strip().lower() for v in ws.col_values(1)[1:] if v and v.strip()}
             tid = (row[0] or "").strip().lower()
-            if tid in existing:
-                self._q.put(("dup", tid))  # أبلغ الخيط الرئيسي بوجود تكرار
-                return
+            if task_id_exists(tid):
+                return "dup", tid
 
-            ws.append_row(row, value_input_option="USER_ENTERED")
-            register_task_id(tid)        # حدّث الكاش محليًا بعد النجاح
-            self._q.put(("ok", ws))
+            # حفظ محلي فوري (المرجع للقراءة)؛ النسخ إلى الشيت يتمّ في الخلفية (_OUTBOX)
+            _STORE.add(row)
+            _OUTBOX.wake()
+            return "ok", ws
         except Exception as e:
-            self._q.put(("err", str(e)))
+            return "err", str(e)
 
 
-    def _poll_append(self):
-        try:
-            status, payload = self._q.get_nowait()
-        except queue.Empty:
-            self.after(120, self._poll_append)
-            return
-        
+    def _on_appended(self, fut):
+        status, payload = fut.result()
+
         duration_hours = f"{self._timer_hours():.2f}"  # مثال: 0.75 ساعة
 
         # توقيف وإخفاء المؤشر ثم إعادة التفاعل أو الانتقال
@@ -1154,24 +3029,21 @@ class TaskFormPage(tk.Frame):
 
         if status == "ok":
             ws = payload
-            # حفظ الافتراضيات
-            self.controller.last_defaults["Project"] = self.var_project.get().strip()
-            self.controller.last_defaults["Level"] = self.var_level.get().strip()
-            self.controller.last_defaults["Verdict"] = self.var_verdict.get().strip()
+            self._remember_defaults()
             self._refresh_daily_stats_from_sheet()
 
+            # مع النسخة المحلية الصف ما زال في صندوق الإرسال؛ الكتابة المباشرة تعني أنه في الشيت
+            in_sheet = _STORE is not _LOCAL_STORE
+
             # تحديث الحالة (إن موجود)
             if hasattr(self.controller, "status"):
-                self.controller.status.set(f"✓ Added to: {ws.spreadsheet.title} / {ws.title} - duration {duration_hours}")
+                where = f"{ws.spreadsheet.title} / {ws.title} - duration {duration_hours}"
+                self.controller.status.set(f"✓ Added to: {where}" if in_sheet else f"⇡ Saved locally, syncing to: {where}")
 
-            # تفريغ الحقول غير الافتراضية
-            self.var_task_id.set("")
-            self.txt_prompt.delete("1.0", "end")
-            self.txt_just.delete("1.0", "end")
-            self.txt_feedback.delete("1.0", "end")
-            self.var_rating.set("")
+            self._clear_task_fields()
 
             # الانتقال لصفحة النجاح
+            self.controller.frames["PostAddPage"].set_just_added(True, in_sheet)
             self.controller.show_frame("PostAddPage")
 
         elif status == "dup":
@@ -1183,6 +3055,20 @@ class TaskFormPage(tk.Frame):
             self._set_busy(False)
             messagebox.showerror("فشل الإضافة", f"حدث خطأ أثناء الإضافة إلى Google Sheets:\n{payload}")
 
+    def _remember_defaults(self):
+        # حفظ الافتراضيات للمهمة التالية
+        self.controller.last_defaults["Project"] = self.var_project.get().strip()
+        self.controller.last_defaults["Level"] = self.var_level.get().strip()
+        self.controller.last_defaults["Verdict"] = self.var_verdict.get().strip()
+
+    def _clear_task_fields(self):
+        # تفريغ الحقول غير الافتراضية
+        self.var_task_id.set("")
+        self.txt_prompt.delete("1.0", "end")
+        self.txt_just.delete("1.0", "end")
+        self.txt_feedback.delete("1.0", "end")
+        self.var_rating.set("")
+
 
     def on_add_task(self):
 
@@ -1193,67 +3079,195 @@ class TaskFormPage(tk.Frame):
         self.controller._maybe_rollover_ot_with_prompt(self)
 
         self._timer_stop()
-        duration_hours = f"{self._timer_hours():.2f}"  # مثال: 0.75 ساعة
 
-        # الحقول النصية الكبيرة
-        prompt = self.txt_prompt.get("1.0", "end").strip()
-        just   = self.txt_just.get("1.0", "end").strip()
-        feed   = self.txt_feedback.get("1.0", "end").strip()
-
-        # وقت الآن محلي (الأردن)
-        jo = JO_TZ
-        now_jo = datetime.now(jo)
-        submitted_now = now_jo.strftime("%H:%M")            # Submitted time (محلي)
-        local_date  = now_jo.strftime("%Y-%m-%d")
-        local_day   = DAY_ABBR[now_jo.weekday()]
-        local_month = MONTH_ABBR[now_jo.month - 1]
-        local_month_num = str(now_jo.month)  
-
-        la = LA_TZ
-        us_now = datetime.now(la)
-        submitted_us = us_now.strftime("%H:%M")
-
-        us_date = us_now.strftime("%Y-%m-%d")
-        us_day_abbr = DAY_ABBR[us_now.weekday()]
-        us_month_abbr = MONTH_ABBR[us_now.month - 1]
-        us_month_num = str(us_now.month)
-
-        # بناء الصف بنفس ترتيب HEADERS
-        row = [
-            self.var_task_id.get().strip(),
-            prompt,
-            just,
-            feed,
-            self.var_rating.get().strip(),
-            self.var_project.get().strip(),
-            duration_hours,
-            self.var_level.get().strip(),
-            self.var_verdict.get().strip(),
-            local_date,
-            local_day,
-            local_month, 
-            local_month_num,
-            self.task_start_local,
-            submitted_now,
-            us_date,            # Date (US)
-            us_day_abbr,        # Day (US)
-            us_month_abbr,      # Month (US)
-            us_month_num,
-            self.task_start_us,
-            submitted_us,        # Submitted time (US)
-            self.controller.var_ot.get().strip(),   # OT
-        ]
-        
+        # بناء الصف بنفس ترتيب HEADERS (وقت الإرسال الآن)
+        row = build_task_row(
+            self.var_task_id.get(),
+            self.txt_prompt.get("1.0", "end"),
+            self.txt_just.get("1.0", "end"),
+            self.txt_feedback.get("1.0", "end"),
+            self.var_rating.get(),
+            self.var_project.get(),
+            self._timer_hours(),
+            self.var_level.get(),
+            self.var_verdict.get(),
+            started_at=self.task_started_at,
+            submitted_at=datetime.now(JO_TZ),
+            ot=self.controller.var_ot.get(),
+        )
+
+        if self.var_pipelined.get():
+            self._submit_pipelined(row)
+            return
+
         # إظهار المؤشر وتعطيل الصفحة ثم الإرسال في خيط
         self._set_busy(True)
         self.prog.grid()
         self.prog.start()
 
-        t = threading.Thread(target=self._worker_append, args=(row,), daemon=True)
-        t.start()
-        self.after(120, self._poll_append)
+        self.controller.bg.submit(self._worker_append, row, on_done=self._on_appended)
         return
     
+    # ======== الوضع المتتابع ========
+    _INFLIGHT_TEXT = {
+        "saving": "⏳ جارٍ الحفظ…",
+        "queued": "⇡ محفوظة محليًا، بانتظار الإرسال",
+        "sent":   "✓ في الشيت",
+        "dup":    "✗ مكرر (لم يُرسل)",
+        "failed": "✗ فشل الإرسال",
+        "err":    "✗ فشل الحفظ",
+    }
+
+    def _on_toggle_pipelined(self):
+        with _edit_cfg() as cfg:
+            cfg["pipelined"] = bool(self.var_pipelined.get())
+        self._apply_pipelined_mode()
+
+    def _apply_pipelined_mode(self):
+        if self.var_pipelined.get():
+            self.btn_finish_day.grid()
+        else:
+            self.btn_finish_day.grid_remove()
+
+    def on_finish_day(self):
+        # لا مهمة أُضيفت للتو: صفحة ما بعد الإضافة بلا عنوان النجاح
+        self.controller.frames["PostAddPage"].set_just_added(False)
+        self.controller.show_frame("PostAddPage")
+
+    def _submit_pipelined(self, row):
+        """
+        الإرسال المتتابع: الصف يُحفظ في الخلفية (ثم يُنسخ للشيت عبر _OUTBOX)، بينما
+        يُفرَّغ النموذج ويبدأ مؤقّت المهمة التالية فورًا دون تعطيل الصفحة.
+        """
+        tid = (row[0] or "").strip().lower()
+        self._inflight.pop(tid, None)
+        self._inflight[tid] = {"row": row, "state": "saving", "error": None}
+        self._tid_unique[tid] = False  # لا تُقبل مرة أخرى أثناء حفظها
+
+        self._remember_defaults()
+        self._clear_task_fields()
+        self._timer_start()
+        self.task_started_at = datetime.now(JO_TZ)
+        self.entry_task_id.focus_set()
+
+        self._render_inflight()
+        self.controller.bg.submit(
+            self._worker_append, row, on_done=lambda fut: self._on_pipelined_appended(tid, fut)
+        )
+
+    def _on_pipelined_appended(self, tid, fut):
+        status, payload = fut.result()
+        item = self._inflight.get(tid)
+        if item is None:
+            return
+        if status == "ok":
+            # مع النسخة المحلية ما زال الصف في صندوق الإرسال؛ الكتابة المباشرة تعني أنه في الشيت.
+            # إشعار _OUTBOX قد يسبق هذه النتيجة: لا نعيد حالة وصلت للشيت إلى "بانتظار الإرسال"
+            in_sheet = _STORE is not _LOCAL_STORE
+            if item["state"] == "saving":
+                item["state"], item["error"] = ("sent" if in_sheet else "queued"), None
+            if hasattr(self.controller, "status"):
+                where = f"{payload.spreadsheet.title} / {payload.title}"
+                self.controller.status.set(f"✓ Added to: {where}" if in_sheet else f"⇡ Saved locally, syncing to: {where}")
+            self._refresh_daily_stats_from_sheet()
+        elif status == "dup":
+            item["state"], item["error"] = "dup", None
+        else:
+            item["state"], item["error"] = "err", payload
+        self._render_inflight()
+
+    def on_outbox_change(self, counts, changes):
+        """
+        إشعار من _OUTBOX (على خيط Tk عبر controller.bg.post): سطر الطابور وحالة المهام
+        المتتابعة التي تغيّرت. changes: {task_id: (state, last_error)}.
+        """
+        parts = []
+        if counts.get("pending"):
+            parts.append(f"بانتظار الإرسال: {counts['pending']}")
+            if _OUTBOX.last_error:
+                parts.append("(لا اتصال، ستُعاد المحاولة)")
+        if counts.get("failed"):
+            parts.append(f"فشل الإرسال: {counts['failed']}")
+        if _OUTBOX.last_dup:
+            parts.append(f"مكرر لم يُرسل: {_OUTBOX.last_dup}")
+        text = "  ".join(parts)
+        if self.var_outbox.get() != text:
+            self.var_outbox.set(text)
+
+        changed = False
+        for tid, (state, error) in changes.items():
+            item = self._inflight.get(tid)
+            if item is None or item["state"] == "err":
+                continue  # ليست في القائمة، أو فشل حفظها محليًا وتنتظر إعادة المستخدم
+            state = {"pending": "queued"}.get(state, state)
+            if (state, error) != (item["state"], item["error"]):
+                item["state"], item["error"] = state, error
+                changed = True
+        if changed:
+            self._render_inflight()
+
+    def _render_inflight(self):
+        # القائمة تبقى قصيرة: تُزال أقدم المهام المنتهية أولًا
+        finished = [tid for tid, it in self._inflight.items() if it["state"] in ("sent", "dup")]
+        while len(self._inflight) > PIPELINE_STATUS_MAX and finished:
+            del self._inflight[finished.pop(0)]
+
+        tree = self.tree_inflight
+        for iid in tree.get_children():
+            if iid not in self._inflight:
+                tree.delete(iid)
+        for tid, it in self._inflight.items():
+            text = self._INFLIGHT_TEXT[it["state"]]
+            if it["error"]:
+                text += " (ستُعاد المحاولة)" if it["state"] == "queued" else f": {it['error'][:80]}"
+            if tree.exists(tid):
+                tree.item(tid, values=(tid, text))
+            else:
+                tree.insert("", 0, iid=tid, values=(tid, text))  # الأحدث في الأعلى
+
+        if self._inflight:
+            self.inflight_box.grid()
+        else:
+            self.inflight_box.grid_remove()
+        self._update_retry_state()
+
+    def _update_retry_state(self):
+        sel = self.tree_inflight.selection()
+        can = bool(sel) and self._inflight.get(sel[0], {}).get("state") in ("failed", "err")
+        self.btn_retry.configure(state="normal" if can else "disabled")
+
+    def on_retry_inflight(self):
+        for tid in self.tree_inflight.selection():
+            item = self._inflight.get(tid)
+            if item is None:
+                continue
+            if item["state"] == "failed":
+                # الصف ما زال محفوظًا محليًا؛ يكفي إعادته للانتظار (كتابة SQLite: خارج خيط الواجهة)
+                item["state"], item["error"] = "saving", None
+                self.controller.bg.submit(
+                    outbox_retry, [tid], on_done=lambda fut, t=tid: self._on_inflight_requeued(t, fut)
+                )
+            elif item["state"] == "err":
+                item["state"], item["error"] = "saving", None
+                self.controller.bg.submit(
+                    self._worker_append, item["row"],
+                    on_done=lambda fut, t=tid: self._on_pipelined_appended(t, fut),
+                )
+        self._render_inflight()
+
+    def _on_inflight_requeued(self, tid, fut):
+        item = self._inflight.get(tid)
+        try:
+            fut.result()
+        except Exception as e:
+            if item is not None:
+                item["state"], item["error"] = "failed", str(e)
+        else:
+            if item is not None:
+                item["state"] = "queued"
+            _OUTBOX.wake()
+        self._render_inflight()
+
     def on_reset_timer(self):
     # رسالة تأكيد قبل إعادة التعيين
         if messagebox.askyesno("تأكيد", "هل تريد إعادة تعيين المؤقت؟"):
@@ -1270,25 +3284,20 @@ class TaskFormPage(tk.Frame):
         self._timer_running = False
         self._t0 = None
         self._elapsed_base = 0.0   # ثوانٍ متراكمة
-        self.timer_lbl.configure(text="00:00:00")
+        self.controller.ticker.set_text(self.timer_lbl, "00:00:00")
 
     def _timer_start(self):
-        # يبدأ من الصفر في كل عرض للصفحة
+        # يبدأ من الصفر في كل عرض للصفحة؛ العرض تتكفّل به النبضة المشتركة
         self._timer_reset()
         self._timer_running = True
         self._t0 = time.perf_counter()
-        self.after(1000, self._timer_tick)
 
-    def _timer_tick(self):
-        if not self._timer_running or self._t0 is None:
-            return
-        now = time.perf_counter()
-        total = self._elapsed_base + (now - self._t0)
+    def _timer_text(self) -> str:
+        total = self._timer_hours() * 3600.0
         h = int(total // 3600)
         m = int((total % 3600) // 60)
         s = int(total % 60)
-        self.timer_lbl.configure(text=f"{h:02d}:{m:02d}:{s:02d}")
-        self.after(1000, self._timer_tick)
+        return f"{h:02d}:{m:02d}:{s:02d}"
 
     def _timer_stop(self):
         if self._timer_running and self._t0 is not None:
@@ -1304,108 +3313,101 @@ class TaskFormPage(tk.Frame):
         return total / 3600.0
     
     
-    def _update_header_dates(self):
-        # عمّان (محلي)
-        jo = JO_TZ
-        now_jo = datetime.now(jo)
-        day_local = DAY_ABBR[now_jo.weekday()]            # Mon..Sun
-        self.header_date_local.configure(
-            text=f"{day_local} - {now_jo.strftime('%Y-%m-%d')} (JOR)"
-        )
-
-        # لوس أنجلِس (US)
-        la = LA_TZ
-        now_la = datetime.now(la)
-        day_us = DAY_ABBR[now_la.weekday()]
-        self.header_date_us.configure(
-            text=f"{day_us} - {now_la.strftime('%Y-%m-%d')} (US)"
-        )
-
+    def _on_tick(self, now: float):
+        """
+        نبضة الثانية لهذه الصفحة (من App.ticker): الساعتان، التاريخان والمؤقّت.
+        الوقت يُحسب مرة واحدة ويُحوَّل للمنطقتين، ولا يُعاد رسم ليبل لم يتغيّر نصه.
+        """
+        set_text = self.controller.ticker.set_text
+        now_jo = datetime.fromtimestamp(now, JO_TZ)
+        now_la = now_jo.astimezone(LA_TZ)
 
-    def _tick_clocks(self):
-        # US (Los Angeles) time 24h
-        la = LA_TZ
-        now_la = datetime.now(la).strftime("%H:%M:%S")
-        self.lbl_us_time.configure(text=f"الوقت الآن (لوس أنجلِس): {now_la}")
+        # US (Los Angeles) / Jordan (Amman) time 24h
+        set_text(self.lbl_us_time, f"الوقت الآن (لوس أنجلِس): {now_la.strftime('%H:%M:%S')}")
+        set_text(self.lbl_jo_time, f"الوقت الآن (الأردن): {now_jo.strftime('%H:%M:%S')}")
 
-        # Jordan (Amman) time 24h
-        jo = JO_TZ
-        now_jo = datetime.now(jo).strftime("%H:%M:%S")
-        self.lbl_jo_time.configure(text=f"الوقت الآن (الأردن): {now_jo}")
+        # التاريخ/اليوم تحت العنوان (يتبدّل تلقائيًا عند منتصف الليل)
+        set_text(self.header_date_local,
+                 f"{DAY_ABBR[now_jo.weekday()]} - {now_jo.strftime('%Y-%m-%d')} (JOR)")
+        set_text(self.header_date_us,
+                 f"{DAY_ABBR[now_la.weekday()]} - {now_la.strftime('%Y-%m-%d')} (US)")
 
-        # حدّث التاريخ/اليوم الأمريكي تحت العنوان
-        # self._update_header_us_date()
+        if self._timer_running:
+            set_text(self.timer_lbl, self._timer_text())
 
-        # حدّث كل ثانية
-        self._clock_job = self.after(1000, self._tick_clocks)
-    
     def _today_local_iso(self) -> str:
     # اليوم بتوقيت عمّان
         return datetime.now(JO_TZ).date().isoformat()
 
     def _refresh_daily_stats_from_sheet(self):
         """
-        يحسب إحصائيات اليوم (عمّان) من الشيت:
-        - عدد المهام (عدد الصفوف التي 'Date' == تاريخ اليوم)
-        - مجموع الساعات من عمود 'Task duration (hour)'
-        ويحدّث الليبلين على الواجهة.
+        يحدّث إحصائيات اليوم (عمّان) في الخلفية دون أن تنتظر الواجهة الشبكة:
+        الليبلان يعرضان فورًا آخر قيم معروفة معلّمة كقديمة (⟳)، ثم تُستبدل عند وصول الجديد.
+        طلبات التحديث أثناء عمل الخيط تُدمج في تحديث واحد بعده.
         """
-        try:
-            ws = get_worksheet()
-            values = ws.get_all_values()  # صفوف كاملة
-            if not values:
-                self.var_stats_line.set("عدد المهام المسلّمة حتى الآن: 0")
-                self.var_stats_hours.set("عدد الساعات حتى الآن: 0 دقيقة (0.00)")
-                return
+        today_iso = self._today_local_iso()
+        last = self._stats_last
+        if last is None:
+            # آخر قيم من تشغيل سابق في نفس اليوم
+            saved = _load_cfg().get("stats_last") or {}
+            last = (saved.get("date"), saved.get("count", 0), saved.get("hours", 0.0))
+        if last[0] == today_iso:
+            self._show_stats(last[1], last[2], stale=True)
+
+        if self._stats_busy:
+            self._stats_again = True
+            return
+        self._stats_busy = True
+
+        self.controller.bg.submit(
+            today_stats, today_iso, on_done=lambda fut: self._on_stats(today_iso, fut)
+        )
 
-            headers = values[0]
-            # حدد فهارس الأعمدة (مرنًا بالاسم؛ وإن فشل، استخدم ترتيب HEADERS الثابت)
-            def col_idx(name: str) -> int:
-                return headers.index(name) if name in headers else HEADERS.index(name)
+    def _on_stats(self, today_iso, fut):
+        try:
+            res = fut.result()
+        except Exception:
+            res = None  # تبقى القيم القديمة معروضة ومعلّمة
+        self._stats_busy = False
+        if res is not None:
+            count, total_hours, stale = res
+            self._show_stats(count, total_hours, stale=stale)
+            if self._stats_last != (today_iso, count, total_hours):
+                self._stats_last = (today_iso, count, total_hours)
+                with _edit_cfg() as cfg:
+                    cfg["stats_last"] = {"date": today_iso, "count": count, "hours": total_hours}
+        if self._stats_again:
+            self._stats_again = False
+            self._refresh_daily_stats_from_sheet()
 
-            idx_date_local = col_idx("Date")
-            idx_duration   = col_idx("Task duration (hour)")
+    def _show_stats(self, count: int, total_hours: float, stale: bool = False):
+        """
+        يحدّث الليبلين:
+        - عدد المهام (عدد الصفوف التي 'Date' == تاريخ اليوم)
+        - مجموع الساعات من عمود 'Task duration (hour)'
+        stale=True: قيم سابقة بانتظار التحديث.
+        """
+        mark = " ⟳" if stale else ""
 
-            today_iso = self._today_local_iso()
-            count = 0
-            total_hours = 0.0
+        # حدّث عدّاد “عدد المهام”
+        self.var_stats_line.set(f"عدد المهام المسلّمة حتى الآن: {count}{mark}")
 
-            for row in values[1:]:
-                # تأكد أن الصف يحتوي الأعمدة المطلوبة
-                if len(row) <= max(idx_date_local, idx_duration):
-                    continue
-                if row[idx_date_local].strip() == today_iso:
-                    count += 1
-                    try:
-                        total_hours += float((row[idx_duration] or "0").strip())
-                    except ValueError:
-                        pass
-
-            # حدّث عدّاد “عدد المهام”
-            self.var_stats_line.set(f"عدد المهام المسلّمة حتى الآن: {count}")
-
-            # حوّل الساعات إلى (ساعات + دقائق) مع تمثيل عشري
-            total_minutes = int(round(total_hours * 60))
-            h = total_minutes // 60
-            m = total_minutes % 60
-            total_hours_dec = total_minutes / 60.0  # تمثيل عشري
-
-            if h == 0:
-                hrs_text = f"{m} دقيقة"
-            elif m == 0:
-                hrs_text = f"{h} ساعة"
-            else:
-                hrs_text = f"{h} ساعة و{m} دقيقة"
+        # حوّل الساعات إلى (ساعات + دقائق) مع تمثيل عشري
+        total_minutes = int(round(total_hours * 60))
+        h = total_minutes // 60
+        m = total_minutes % 60
+        total_hours_dec = total_minutes / 60.0  # تمثيل عشري
 
-            self.var_stats_hours.set(
-                f"({total_hours_dec:.2f}) الساعات حتى الآن: {hrs_text}"
-            )
+        if h == 0:
+            hrs_text = f"{m} دقيقة"
+        elif m == 0:
+            hrs_text = f"{h} ساعة"
+        else:
+            hrs_text = f"{h} ساعة و{m} دقيقة"
 
-        except Exception as e:
-            # في حال خطأ شبكة/صلاحيات، لا نكسر الواجهة
-            # حافظ على القيم الحالية أو صفّرها بلطف
-            # (يمكنك إظهار رسالة إذا تحب)
-            pass
+        self.var_stats_hours.set(
+            f"({total_hours_dec:.2f}) الساعات حتى الآن: {hrs_text}{mark}"
+        )
 
 
 class PostAddPage(tk.Frame):
@@ -1413,16 +3415,16 @@ class PostAddPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
-        lbl = ttk.Label(self, text="تمت إضافة المهمة بنجاح", style="Header.TLabel")
-        lbl.pack(pady=24)
+        self.header_lbl = ttk.Label(self, text="تمت إضافة المهمة بنجاح", style="Header.TLabel")
+        self.header_lbl.pack(pady=24)
 
         btns = ttk.Frame(self)
         btns.pack(pady=6)
 
-        btn_add_new = ttk.Button(btns, text="إضافة مهمة جديدة", width=24, command=self.add_new_task)
-        btn_finish  = ttk.Button(btns, text="إنهاء العمل", width=24, command=self.finish_work)
-        btn_add_new.grid(row=0, column=0, padx=8, pady=4)
-        btn_finish.grid(row=0, column=1, padx=8, pady=4)
+        self.btn_add_new = ttk.Button(btns, text="إضافة مهمة جديدة", width=24, command=self.add_new_task)
+        self.btn_finish  = ttk.Button(btns, text="إنهاء العمل", width=24, command=self.finish_work)
+        self.btn_add_new.grid(row=0, column=0, padx=8, pady=4)
+        self.btn_finish.grid(row=0, column=1, padx=8, pady=4)
 
         # بعد btn_finish.grid(...)
         self.result_lbl = ttk.Label(
@@ -1436,6 +3438,28 @@ class PostAddPage(tk.Frame):
         )
         self.result_lbl.pack(pady=20, fill="x")
 
+        # تقدّم خطوات إنهاء العمل (مخفي حتى الضغط على "إنهاء العمل")
+        self.steps_box = ttk.Labelframe(self, text="إنهاء العمل", style="Card.TLabelframe")
+        self._step_vars = {}
+        for i, (key, title) in enumerate(FINISH_STEPS):
+            ttk.Label(self.steps_box, text=title, anchor="e").grid(row=i, column=1, sticky="e", padx=6, pady=2)
+            var = tk.StringVar(value="")
+            ttk.Label(self.steps_box, textvariable=var, anchor="w").grid(row=i, column=0, sticky="w", padx=6, pady=2)
+            self._step_vars[key] = var
+
+
+    def set_just_added(self, just_added: bool, in_sheet: bool = True):
+        """
+        العنوان حسب طريقة الوصول: بعد إضافة مهمة، أو من زر "إنهاء العمل…" في الوضع المتتابع.
+        in_sheet=False: المهمة محفوظة محليًا فقط وما زالت في صندوق الإرسال.
+        """
+        if not just_added:
+            text = "متابعة العمل أو إنهاؤه"
+        elif in_sheet:
+            text = "تمت إضافة المهمة بنجاح"
+        else:
+            text = "حُفظت المهمة محليًا، وجارٍ إرسالها للشيت"
+        self.header_lbl.configure(text=text)
 
     def add_new_task(self):
         # العودة لنفس التاريخ مع بقاء القيم الافتراضية
@@ -1449,30 +3473,103 @@ class PostAddPage(tk.Frame):
             "هل تريد حفظ الملف (CSV) قبل إنهاء العمل؟",
             parent=self
         )
-        if save:
-            try:
-                path = export_current_worksheet_to_csv()
-                messagebox.showinfo("تم الحفظ", f"تم حفظ الملف:\n{path}", parent=self)
-            except Exception as e:
-                messagebox.showerror("فشل الحفظ", f"تعذّر حفظ الملف:\n{e}", parent=self)
 
+        # الخطوات تعمل في الخلفية؛ الواجهة تعرض حالة كل خطوة ولا تتجمّد
+        for b in (self.btn_add_new, self.btn_finish):
+            b.configure(state="disabled")
+        for key, _ in FINISH_STEPS:
+            self._step_vars[key].set("⏳ بالانتظار")
+        self.steps_box.pack(pady=(0, 12), padx=12)
+
+        # تقارير الخطوات وانتهاؤها تُرسل لخيط الواجهة عبر controller.bg (بالترتيب)
+        post = self.controller.bg.post
+        self._finish_results = {}
+        self._finish_done = False
+        self._finish_futures = run_finish_of_day(
+            save, lambda step, state, payload: post(self._on_finish_step, step, state, payload)
+        )
+        for fut in self._finish_futures.values():
+            fut.add_done_callback(lambda _f: post(self._on_finish_progress))
+
+    def _on_finish_step(self, step, state, payload):
+        self._finish_results[step] = (state, payload)
+        self._step_vars[step].set(self._step_text(step, state, payload))
 
-                # 2) تحديث الشيت الخارجي (Daily Hours + WFH) بالتاريخ المحلي (عمّان)
+    def _on_finish_progress(self):
+        # تقرير كل خطوة يُرسَل قبل اكتمال Future الخاص بها، فعند آخر اكتمال تكون كل التقارير وصلت
+        if self._finish_done or not all(f.done() for f in self._finish_futures.values()):
+            return
+        self._finish_done = True
+        self._finish_summary()
+
+    @staticmethod
+    def _step_text(step, state, payload) -> str:
+        if state == "run":
+            return "🔄 جارٍ التنفيذ…"
+        if state == "skip":
+            return "— تخطّي"
+        if state == "err":
+            return f"✗ فشل: {payload}"
+        if step == "outbox":
+            return "✓ تم" if payload else "⚠ بقيت مهام محفوظة محليًا"
+        if step == "export":
+            return f"✓ {Path(payload).name}"
+        if step == "hours":
+            return f"✓ {payload:.2f} ساعة"
+        if step == "daily":
+            return "✓ تم التحديث" if payload else "✓ لا تغيير"
+        if step == "wfh":
+            return "✓ تم الإضافة" if payload else "✓ لا إضافة"
+        return "✓"
+
+    def _finish_summary(self):
         try:
-            total_hours = compute_today_hours_from_current_sheet()  # يجمع ساعات اليوم من الورقة الحالية (عمود Date محلي)
-            wrote_hours = update_daily_hours_in_external_sheet(total_hours)  # overwrite فقط عند تغيّر القيمة
-            added_wfh   = upsert_wfh_row_if_needed(total_hours)             # يُضيف صفًا واحدًا فقط إذا > 7 ساعات ولم يُضف سابقًا
+            self._show_finish_summary()
+        finally:
+            # أغلِق التطبيق على أي حال بعد الإجابة (حتى لو فشل عرض الملخّص)
+            self.controller.destroy()
+
+    def _show_finish_summary(self):
+        res = self._finish_results
+        state, payload = res.get("outbox", ("skip", None))
+        if state == "err":
+            messagebox.showerror(
+                "صندوق الإرسال",
+                f"تعذّر إرسال المهام المعلّقة:\n{payload}\nهي محفوظة محليًا وستُرسل تلقائيًا عند الاتصال القادم.",
+                parent=self
+            )
+        elif (state, payload) == ("ok", False):
+            messagebox.showwarning(
+                "صندوق الإرسال",
+                "تعذّر إرسال بعض المهام الآن. هي محفوظة محليًا وستُرسل تلقائيًا عند الاتصال القادم.",
+                parent=self
+            )
 
+        state, payload = res.get("export", ("skip", None))
+        if state == "ok":
+            messagebox.showinfo("تم الحفظ", f"تم حفظ الملف:\n{payload}", parent=self)
+        elif state == "err":
+            messagebox.showerror("فشل الحفظ", f"تعذّر حفظ الملف:\n{payload}", parent=self)
+
+        # تحديث الشيت الخارجي (Daily Hours + WFH) بالتاريخ المحلي (عمّان)
+        # أي خطوة لم تنجح (خطأ، أو تخطٍّ لفشل خطوة سابقة) تُعرض كفشل
+        errors = []
+        for key, title in FINISH_STEPS:
+            if key not in ("hours", "daily", "wfh"):
+                continue
+            state, payload = res.get(key, ("skip", None))
+            if state == "err":
+                errors.append(f"{title}: {payload}")
+            elif state != "ok":
+                errors.append(f"{title}: لم تُنفّذ (فشلت خطوة سابقة)")
+        if errors:
+            messagebox.showerror("فشل تحديث الشيت الخارجي", "تعذّر التحديث:\n" + "\n".join(errors), parent=self)
+        else:
+            total_hours = res["hours"][1]
             parts = [f"مجموع ساعات اليوم (محلي): {total_hours:.2f}"]
-            parts.append("Daily Hours: تم التحديث" if wrote_hours else "Daily Hours: لا تغيير")
-            parts.append("WFH: تم الإضافة" if added_wfh else "WFH: لا إضافة")
+            parts.append("Daily Hours: تم التحديث" if res["daily"][1] else "Daily Hours: لا تغيير")
+            parts.append("WFH: تم الإضافة" if res["wfh"][1] else "WFH: لا إضافة")
             messagebox.showinfo("تحديث الشيت الخارجي", "\n".join(parts), parent=self)
-        except Exception as e:
-            messagebox.showerror("فشل تحديث الشيت الخارجي", f"تعذّر التحديث:\n{e}", parent=self)
-
-        # أغلِق التطبيق على أي حال بعد الإجابة
-        self.controller.destroy()
 
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
+    sys.exit(main())